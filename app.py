@@ -5,22 +5,86 @@ import os
 import time
 import json
 from nameSearch import findNameAndPopulate
-from fetchPapers import fetch_papers_and_update_json
-from profileWriter import generate_profile_for_latest_entry, regenerate_profile
+from profileWriter import regenerate_profile
+import jobQueue
+import paperStore
+import profileStore
+import searchIndex
+import metrics
 # from clustering import update_embeddings, visualize_clusters
 
-# Load or Initialize CSV
+# Profiles live in the SQLite store next to the legacy CSV
 filename = "authors_profiles.csv"
-try:
-    data = pd.read_csv(filename)
-except FileNotFoundError:
-    data = pd.DataFrame(columns=["name", "oaid", "institution", "email", "profile_llm", "human_input", "profile_llm_human", "classification", "input"])
+
+@st.cache_data
+def load_profiles(path, version):
+    # Cached per store version, so writes from other sessions and modules invalidate it too
+    return profileStore.read_profiles(path)
+
+def read_profiles():
+    return load_profiles(filename, profileStore.store_version(filename))
+
+def save_profile_fields(oaid, **fields):
+    # Keyed row update; concurrent sessions only touch their own author's fields
+    profileStore.update_profiles({oaid: fields}, filename)
+
+def resolve_author(author_name):
+    """
+    Resolve the current author's (oaid, name) once per session instead of on every rerun.
+    """
+    author_name = author_name.strip()
+    resolved = st.session_state.get("resolved_author")
+    if resolved is None or resolved["query"] != author_name:
+        oaid, name = findNameAndPopulate(author_name)
+        resolved = {"query": author_name, "oaid": oaid, "name": name}
+        st.session_state.resolved_author = resolved
+    return resolved["oaid"], resolved["name"]
+
+@st.cache_data
+def load_profile_page(version, columns, search, sort_by, ascending, offset, limit):
+    # Cached per store version, like load_profiles
+    return profileStore.query_profiles(
+        columns=list(columns), search=search, sort_by=None if sort_by == "(none)" else sort_by,
+        ascending=ascending, offset=offset, limit=limit, csv_file=filename
+    )
+
+def query_profile_page(columns, search, sort_by, ascending, offset, limit):
+    return load_profile_page(profileStore.store_version(filename), tuple(columns), search, sort_by, ascending, offset, limit)
+
+@st.cache_data
+def load_metrics(oaids, version):
+    # Cached per metrics version, which the paper-store writers bump after recomputing
+    return metrics.get_metrics(list(oaids))
+
+def read_metrics(oaids):
+    return load_metrics(tuple(oaids), metrics.metrics_version())
+
+def show_author_metrics(oaid):
+    # Read from the precomputed metrics table
+    author_metrics = read_metrics([oaid])
+    if author_metrics.empty or not author_metrics.iloc[0]["works"]:
+        return
+    row = author_metrics.iloc[0]
+    columns = st.columns(5)
+    columns[0].metric("h-index", int(row["h_index"]))
+    columns[1].metric("i10-index", int(row["i10_index"]))
+    columns[2].metric("Citations", int(row["total_citations"]))
+    columns[3].metric(f"Citations (last {metrics.recent_years} years)", int(row["recent_citations"]))
+    columns[4].metric("Works per year", f"{row['output_per_year']:.1f}")
+
+@st.cache_resource
+def start_job_workers():
+    # One worker pool per server process, shared by all sessions
+    return jobQueue.start_workers(count=2)
+
+start_job_workers()
+data = read_profiles()
 
 # Set the Streamlit theme to Light
 st.set_page_config(page_title="Profile Builder", layout="wide", initial_sidebar_state="expanded")
 
 # Add tabs
-tab_profile, tab_csv = st.tabs(["Profile Builder", "Database"])
+tab_profile, tab_similar, tab_csv = st.tabs(["Profile Builder", "Similar Researchers", "Database"])
 
 with tab_profile:
     sidebar_logo_path = "logo_sidebar/logo.png"
@@ -53,54 +117,28 @@ with tab_profile:
     search_button = st.sidebar.button("Search and generate profile")
 
     if search_button:
+        job_id = oaid = None
         if input_mode == "Name" and st.session_state.author_name.strip():
-            try:
-                # Access OpenAlex to get information for the author
-                oaid, name = findNameAndPopulate(st.session_state.author_name.strip())
+            name = st.session_state.author_name.strip()
 
-                # Normalize the 'name' column for comparison
-                data['name_normalised'] = data['name'].astype(str).str.lower().str.strip()
+            # Normalize the 'name' column for comparison
+            data['name_normalised'] = data['name'].astype(str).str.lower().str.strip()
 
-                # Check for duplicates
-                if st.session_state.author_name.strip().lower() in data['name_normalised'].values:
-                    st.warning(f"{name.title()} is already in the database.")
-                else:
-                    # Add the author to the DataFrame
-                    new_row = {"oaid": oaid, "name": name, "institution": institution, "email": email}
-                    data = pd.concat([data, pd.DataFrame([new_row])], ignore_index=True)
-
-                    # Drop the temporary 'name_normalised' column
-                    data = data.drop(columns=['name_normalised'])
-
-                    # Save the updated CSV
-                    data.to_csv(filename, index=False)
-
-                    # Fetch papers for the latest author and update the JSON
-                    with st.spinner("Fetching papers..."):
-                        author_data, result_count = fetch_papers_and_update_json(
-                            filename, output_json="authors_papers.json"
-                        )
-
-                    # Display a success message
-                    if result_count > 0:
-                        st.success(f"Added {name.title()} (OpenAlex ID: {oaid}) to the database. Found {result_count} papers.")
-                    else:
-                        st.warning(f"Added {name.title()} (OpenAlex ID: {oaid}) to the database, but no papers were found.")
-
-                    with st.spinner("Generating profile..."):
-                        generate_profile_for_latest_entry(
-                            json_file="authors_papers.json",
-                            output_csv="authors_profiles.csv"
-                        )
-                        st.success(f"Profile for {name.title()} has been generated and saved.")
-
-            except ValueError as e:
-                st.error(str(e))
-
-        elif input_mode == "OpenAlex ID" and openalex_id:
+            # Check for duplicates
+            if name.lower() in data['name_normalised'].values:
+                st.warning(f"{name.title()} is already in the database.")
+                existing_row = data.loc[data['name_normalised'] == name.lower()].iloc[0]
+                oaid = existing_row['oaid']
+                st.session_state.resolved_author = {"query": name, "oaid": oaid, "name": name}
+            else:
+                # Resolution, paper fetching and profiling run in a background worker
+                job_id = jobQueue.enqueue(name, institution=institution, email=email)
+
+        elif input_mode == "OpenAlex ID" and openalex_id.strip():
             # Use the OpenAlex ID directly to fetch papers
-            oaid = openalex_id.strip()
+            oaid = paperStore.normalize_oaid(openalex_id)
             name = st.session_state.author_name.strip() if st.session_state.author_name else "Unknown Author"
+            st.session_state.resolved_author = {"query": st.session_state.author_name.strip(), "oaid": oaid, "name": name}
             
             # Normalize the `name` and `oaid` for comparison
             data['name_normalized'] = data['name'].astype(str).str.lower().str.strip()
@@ -115,46 +153,65 @@ with tab_profile:
             if is_duplicate:
                 st.warning(f"{name.title()} (OpenAlex ID: {oaid}) is already in the database.")
             else:
-                # Add the author to the DataFrame
-                new_row = {"oaid": oaid, "name": name, "institution": institution, "email": email}
-                data = pd.concat([data, pd.DataFrame([new_row])], ignore_index=True)
-
-                # Drop temporary columns
-                data = data.drop(columns=['name_normalized', 'oaid_normalized'])
-
-                # Save the updated CSV
-                data.to_csv(filename, index=False)
-
-                # Fetch papers for the given OpenAlex ID and update the JSON
-                with st.spinner(text='Fetching papers'):
-                    author_data, result_count = fetch_papers_and_update_json(
-                        filename, output_json='authors_papers.json'
-                    )
-
-                    # Display a success message with the result count
-                    if result_count > 0:
-                        st.success(f"Added {name.title()} (OpenAlex ID: {oaid}) to the database. Found {result_count} papers.")
-                    else:
-                        st.warning(f"Added {name.title()} (OpenAlex ID: {oaid}) to the database, but no papers were found.")
-
-                with st.spinner(text='Generating profile'):
-                    generate_profile_for_latest_entry(
-                        json_file='authors_papers.json',
-                        output_csv='authors_profiles.csv'
-                    )
-                    st.success(f"Profile for {name.title()} has been generated and saved.")
-        
-        # Load the profiles CSV to fetch the latest profile
-        profiles_df = pd.read_csv('authors_profiles.csv')
-        profile_row = profiles_df.loc[profiles_df['oaid'] == oaid]
-
-        if not profile_row.empty:
-            # Extract and display the profile
-            latest_profile = profile_row.iloc[0]['profile_llm']
-            st.subheader(f"Generated Profile for {name.title()}")
-            st.write(latest_profile)
-        else:
-            st.error(f"No profile found for {name.title()} (OAID: {oaid}). Please check the data.")
+                job_id = jobQueue.enqueue(name, oaid=oaid, institution=institution, email=email)
+
+        if job_id is not None:
+            # Remember the job in the session and the URL so it survives page reloads
+            st.session_state.job_id = job_id
+            st.query_params["job"] = str(job_id)
+            st.info(f"Queued {name.title()} for profile generation (job {job_id}).")
+        elif oaid:
+            # Show the existing profile
+            profile_row = data.loc[data['oaid'] == oaid]
+            if not profile_row.empty and pd.notna(profile_row.iloc[0]['profile_llm']):
+                st.subheader(f"Generated Profile for {name.title()}")
+                show_author_metrics(oaid)
+                st.write(profile_row.iloc[0]['profile_llm'])
+            else:
+                st.error(f"No profile found for {name.title()} (OAID: {oaid}). Please check the data.")
+
+    # Restore the job being followed after a page reload
+    if "job_id" not in st.session_state and st.query_params.get("job", "").isdigit():
+        st.session_state.job_id = int(st.query_params["job"])
+
+    def current_job():
+        return jobQueue.get_job(st.session_state.job_id) if "job_id" in st.session_state else None
+
+    # Poll only while the job is running, and faster while the profile streams in
+    poll_seconds = {"queued": 2, "fetching": 2, "profiling": 0.5}
+    job = current_job()
+    run_every = poll_seconds.get(job["status"]) if job is not None else None
+    polling = run_every is not None
+
+    @st.fragment(run_every=run_every)
+    def show_job_progress():
+        job = current_job()
+        if job is None:
+            return
+
+        if job["status"] in ("queued", "fetching", "profiling"):
+            st.info(f"{job['name'].title()}: {job['status']}...")
+        if job["status"] == "failed":
+            st.error(f"Profile generation for {job['name'].title()} failed: {job['error']}")
+        if job["result_count"] is not None and job["status"] != "failed":
+            st.caption(f"Found {job['result_count']} papers.")
+        if job["profile"]:
+            # Partial while profiling, complete once done
+            st.subheader(f"Generated Profile for {job['name'].title()}")
+            if job["status"] == "done" and job["oaid"]:
+                show_author_metrics(job["oaid"])
+            st.write(job["profile"])
+        if job["status"] == "done":
+            st.session_state.resolved_author = {"query": job["name"], "oaid": job["oaid"], "name": job["name"]}
+        if polling and poll_seconds.get(job["status"]) != run_every:
+            # Rerun the page when the polling interval changes, e.g. once the job finishes
+            st.rerun()
+
+    show_job_progress()
+
+    with st.sidebar.expander("Recent jobs"):
+        for job in jobQueue.recent_jobs():
+            st.write(f"#{job['id']} {job['name']}: {job['status']}")
 
     # Initialize session state for feedback
     if "feedback" not in st.session_state:
@@ -183,9 +240,9 @@ with tab_profile:
         # Button to submit input and regenerate profile
         if st.sidebar.button("Submit Input"):
             # Access OpenAlex to get information for the author
-            oaid, name = findNameAndPopulate(st.session_state.author_name)
+            oaid, name = resolve_author(st.session_state.author_name)
 
-            # Load the profiles CSV to fetch the latest profile
+            # Look up the latest profile in the loaded table
 
             profiles_df = data
             profile_row = profiles_df.loc[profiles_df['oaid'] == oaid]
@@ -200,27 +257,20 @@ with tab_profile:
             if user_input.strip():
                 print(f"User Input: {user_input}")  # Debug print
 
-                # Save the human input in the CSV
-                profiles_df.loc[profiles_df['oaid'] == oaid, 'human_input'] = user_input
-                profiles_df.loc[profiles_df['oaid'] == oaid, 'input'] = "Yes"
-                profiles_df.to_csv('authors_profiles.csv', index=False)
-                print("Saved user input to CSV.")  # Debug print
-
-                # Regenerate the profile with the new input
-                with st.spinner("Regenerating profile..."):
-                    new_profile = regenerate_profile(latest_profile, user_input)
-                    print(f"New Profile: {new_profile}")  # Debug print
-                    profiles_df.loc[profiles_df['oaid'] == oaid, 'profile_llm_human'] = new_profile
-                    profiles_df.to_csv('authors_profiles.csv', index=False)
+                # Save the human input in the profile store
+                save_profile_fields(oaid, human_input=user_input, input="Yes")
+                print("Saved user input.")  # Debug print
 
-                st.sidebar.success("The profile has been updated with your input!")
-
-                # Display profiles for comparison
+                # Display profiles for comparison, streaming the regenerated profile
                 st.subheader(f"Updated Profile for {name.title()}")
                 st.write("### Original Profile")
                 st.write(latest_profile)
                 st.write("### Updated Profile")
-                st.write(new_profile)
+                new_profile = regenerate_profile(latest_profile, user_input, stream_handler=st.write_stream)
+                print(f"New Profile: {new_profile}")  # Debug print
+                save_profile_fields(oaid, profile_llm_human=new_profile)
+
+                st.sidebar.success("The profile has been updated with your input!")
             else:
                 st.sidebar.error("Please provide input before submitting.")
 
@@ -228,9 +278,9 @@ with tab_profile:
         # Check session state to persist the confirmation
         if not st.session_state.no_confirmed:
                             # Access OpenAlex to get information for the author
-            oaid, name = findNameAndPopulate(st.session_state.author_name)
+            oaid, name = resolve_author(st.session_state.author_name)
 
-            # Load the profiles CSV to fetch the latest profile
+            # Look up the latest profile in the loaded table
 
             profiles_df = data
             profile_row = profiles_df.loc[profiles_df['oaid'] == oaid]
@@ -241,15 +291,72 @@ with tab_profile:
             else:
                 st.error(f"No profile found for {name.title()} (OAID: {oaid}). Please check the data.")
             print("Feedback: No")  # Debug print
-            profiles_df.loc[profiles_df['oaid'] == oaid, 'input'] = "No"
-            profiles_df.to_csv('authors_profiles.csv', index=False)
-            print("Saved 'No' feedback to CSV.")  # Debug print
+            save_profile_fields(oaid, input="No")
+            print("Saved 'No' feedback.")  # Debug print
 
             st.sidebar.success("Thank you for your feedback!")
             st.session_state.no_confirmed = True
         else:
             st.sidebar.success("You have already confirmed 'No'.")
+with tab_similar:
+    known_authors = data.dropna(subset=["oaid"])
+    similar_mode = st.radio("Find researchers similar to", ["An author", "A research topic"], horizontal=True)
+    if similar_mode == "An author":
+        selected = st.selectbox("Author", known_authors["oaid"], format_func=lambda value: known_authors.loc[known_authors["oaid"] == value, "name"].iloc[0])
+        similar_query = selected
+    else:
+        similar_query = st.text_input("Describe the research topic")
+    top_k = st.slider("Number of researchers", 1, 20, 5)
+
+    if st.button("Find Similar Researchers") and similar_query:
+        # Imported here so the embedding model only loads when this tab is used
+        import clustering
+        import similarSearch
+        with st.spinner("Searching profiles..."):
+            clustering.update_embeddings(data)
+            try:
+                if similar_mode == "An author":
+                    results = similarSearch.similar_researchers(similar_query, k=top_k)
+                else:
+                    results = similarSearch.search_researchers(similar_query, k=top_k)
+            except KeyError:
+                results = None
+                st.warning("This author has no profile embedding yet.")
+        if results is not None:
+            results_df = pd.DataFrame(results, columns=["name", "oaid", "classification", "score"])
+            results_df = results_df.join(
+                read_metrics(results_df["oaid"])[["h_index", "total_citations", "recent_citations"]], on="oaid"
+            )
+            st.dataframe(results_df, hide_index=True)
+
 with tab_csv:
-    df = data
-    st.data_editor(df)
+    search_query = st.text_input("Search titles, abstracts and profiles")
+    if search_query.strip():
+        profile_hits = searchIndex.search_profiles(search_query, limit=20)
+        paper_hits = searchIndex.search_papers(search_query, limit=50)
+        st.write(f"### Profiles ({len(profile_hits)})")
+        st.dataframe(pd.DataFrame(profile_hits, columns=["name", "oaid", "snippet", "score"]), hide_index=True)
+        st.write(f"### Papers ({len(paper_hits)})")
+        st.dataframe(pd.DataFrame(paper_hits, columns=["title", "work_id", "snippet", "oaids", "score"]), hide_index=True)
+
+    # Only the visible page of the chosen columns is read, sent to the browser and written back
+    available_columns = [column for column in profileStore.profile_columns if column != "oaid"]
+    default_columns = [column for column in available_columns if column not in profileStore.text_columns]
+    table_columns = st.multiselect("Columns", available_columns, default=default_columns)
+    filter_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+    table_filter = filter_col.text_input("Filter by name, institution or email")
+    sort_by = sort_col.selectbox("Sort by", ["(none)"] + available_columns)
+    ascending = order_col.radio("Order", ["Ascending", "Descending"]) == "Ascending"
+    page_size = size_col.selectbox("Rows per page", [25, 50, 100], index=1)
+
+    _, total_rows = query_profile_page(table_columns, table_filter, sort_by, ascending, 0, 0)
+    page_count = max(1, -(-total_rows // page_size))
+    page_number = st.number_input(f"Page (of {page_count}, {total_rows} rows)", min_value=1, max_value=page_count, value=1)
+    page, _ = query_profile_page(table_columns, table_filter, sort_by, ascending, (page_number - 1) * page_size, page_size)
+
+    edited_page = st.data_editor(page, disabled=["id", "oaid"], hide_index=True, key=f"profiles_page_{page_number}")
+    changes = profileStore.changed_fields(page, edited_page)
+    if changes and st.button(f"Save changes to {len(changes)} row(s)"):
+        profileStore.update_profiles(changes, filename, key="id")
+        st.success(f"Saved changes to {len(changes)} row(s).")
 
@@ -1,20 +1,18 @@
 import streamlit as st
-import pandas as pd
 from pyalex import Works, Authors
 import os
 import time
 import json
 from nameSearch import findNameAndPopulate
-from fetchPapers import fetch_papers_and_update_json
-from profileWriter import generate_profile_for_latest_entry, regenerate_profile
+from fetchPapers import fetch_papers_for_oaid
+from profileWriter import generate_profile_for_oaid, regenerate_profile
+import paperStore
+import profileStore
 # from clustering import update_embeddings, visualize_clusters
 
-# Load or Initialize CSV
+# Profiles live in the SQLite store next to the legacy CSV
 filename = "authors_profiles.csv"
-try:
-    data = pd.read_csv(filename)
-except FileNotFoundError:
-    data = pd.DataFrame(columns=["name", "oaid", "institution", "profile_llm", "human_input", "profile_llm_human", "classification", "input"])
+data = profileStore.read_profiles(filename)
 
 # Set the Streamlit theme to Light
 st.set_page_config(page_title="Profile Builder", layout="wide", initial_sidebar_state="expanded")
@@ -60,21 +58,16 @@ with tab_profile:
                 # Check for duplicates
                 if st.session_state.author_name.strip().lower() in data['name_normalised'].values:
                     st.warning(f"{name.title()} is already in the database.")
+                elif oaid is None:
+                    st.error(f"No OpenAlex ID found for {name.title()}.")
                 else:
-                    # Add the author to the DataFrame
-                    new_row = {"oaid": oaid, "name": name, "institution": institution}
-                    data = pd.concat([data, pd.DataFrame([new_row])], ignore_index=True)
+                    # Add the author to the profile store, keyed by OAID
+                    profileStore.upsert_profile(oaid, {"name": name, "institution": institution}, filename)
 
-                    # Drop the temporary 'name_normalised' column
-                    data = data.drop(columns=['name_normalised'])
-
-                    # Save the updated CSV
-                    data.to_csv(filename, index=False)
-
-                    # Fetch papers for the latest author and update the JSON
+                    # Fetch papers for this author into the paper store
                     with st.spinner("Fetching papers..."):
-                        author_data, result_count = fetch_papers_and_update_json(
-                            filename, output_json="authors_papers.json"
+                        author_data, result_count = fetch_papers_for_oaid(
+                            oaid, name, json_file="authors_papers.json"
                         )
 
                     # Display a success message
@@ -84,7 +77,8 @@ with tab_profile:
                         st.warning(f"Added {name.title()} (OpenAlex ID: {oaid}) to the database, but no papers were found.")
 
                     with st.spinner("Generating profile..."):
-                        generate_profile_for_latest_entry(
+                        generate_profile_for_oaid(
+                            oaid,
                             json_file="authors_papers.json",
                             output_csv="authors_profiles.csv"
                         )
@@ -93,9 +87,9 @@ with tab_profile:
             except ValueError as e:
                 st.error(str(e))
 
-        elif input_mode == "OpenAlex ID" and openalex_id:
+        elif input_mode == "OpenAlex ID" and openalex_id.strip():
             # Use the OpenAlex ID directly to fetch papers
-            oaid = openalex_id.strip()
+            oaid = paperStore.normalize_oaid(openalex_id)
             name = st.session_state.author_name.strip() if st.session_state.author_name else "Unknown Author"
 
             # Normalize the `name` and `oaid` for comparison
@@ -111,20 +105,13 @@ with tab_profile:
             if is_duplicate:
                 st.warning(f"{name.title()} (OpenAlex ID: {oaid}) is already in the database.")
             else:
-                # Add the author to the DataFrame
-                new_row = {"oaid": oaid, "name": name, "institution": institution}
-                data = pd.concat([data, pd.DataFrame([new_row])], ignore_index=True)
-
-                # Drop temporary columns
-                data = data.drop(columns=['name_normalized', 'oaid_normalized'])
-
-                # Save the updated CSV
-                data.to_csv(filename, index=False)
+                # Add the author to the profile store, keyed by OAID
+                profileStore.upsert_profile(oaid, {"name": name, "institution": institution}, filename)
 
-                # Fetch papers for the given OpenAlex ID and update the JSON
+                # Fetch papers for the given OpenAlex ID into the paper store
                 with st.spinner(text='Fetching papers'):
-                    author_data, result_count = fetch_papers_and_update_json(
-                        filename, output_json='authors_papers.json'
+                    author_data, result_count = fetch_papers_for_oaid(
+                        oaid, name, json_file='authors_papers.json'
                     )
 
                     # Display a success message with the result count
@@ -134,14 +121,15 @@ with tab_profile:
                         st.warning(f"Added {name.title()} (OpenAlex ID: {oaid}) to the database, but no papers were found.")
 
                 with st.spinner(text='Generating profile'):
-                    generate_profile_for_latest_entry(
+                    generate_profile_for_oaid(
+                        oaid,
                         json_file='authors_papers.json',
                         output_csv='authors_profiles.csv'
                     )
                     st.success(f"Profile for {name.title()} has been generated and saved.")
         
-        # Load the profiles CSV to fetch the latest profile
-        profiles_df = pd.read_csv('authors_profiles.csv')
+        # Read the profiles again to pick up the one just generated
+        profiles_df = profileStore.read_profiles(filename)
         profile_row = profiles_df.loc[profiles_df['oaid'] == oaid]
 
         if not profile_row.empty:
@@ -181,7 +169,7 @@ with tab_profile:
             # Access OpenAlex to get information for the author
             oaid, name = findNameAndPopulate(st.session_state.author_name)
 
-            # Load the profiles CSV to fetch the latest profile
+            # Look up the latest profile in the loaded table
 
             profiles_df = data
             profile_row = profiles_df.loc[profiles_df['oaid'] == oaid]
@@ -196,18 +184,15 @@ with tab_profile:
             if user_input.strip():
                 print(f"User Input: {user_input}")  # Debug print
 
-                # Save the human input in the CSV
-                profiles_df.loc[profiles_df['oaid'] == oaid, 'human_input'] = user_input
-                profiles_df.loc[profiles_df['oaid'] == oaid, 'input'] = "Yes"
-                profiles_df.to_csv('authors_profiles.csv', index=False)
-                print("Saved user input to CSV.")  # Debug print
+                # Save the human input in the profile store
+                profileStore.update_profiles({oaid: {'human_input': user_input, 'input': "Yes"}}, filename)
+                print("Saved user input.")  # Debug print
 
                 # Regenerate the profile with the new input
                 with st.spinner("Regenerating profile..."):
                     new_profile = regenerate_profile(latest_profile, user_input)
                     print(f"New Profile: {new_profile}")  # Debug print
-                    profiles_df.loc[profiles_df['oaid'] == oaid, 'profile_llm_human'] = new_profile
-                    profiles_df.to_csv('authors_profiles.csv', index=False)
+                    profileStore.update_profiles({oaid: {'profile_llm_human': new_profile}}, filename)
 
                 st.sidebar.success("The profile has been updated with your input!")
 
@@ -226,7 +211,7 @@ with tab_profile:
                             # Access OpenAlex to get information for the author
             oaid, name = findNameAndPopulate(st.session_state.author_name)
 
-            # Load the profiles CSV to fetch the latest profile
+            # Look up the latest profile in the loaded table
 
             profiles_df = data
             profile_row = profiles_df.loc[profiles_df['oaid'] == oaid]
@@ -237,9 +222,8 @@ with tab_profile:
             else:
                 st.error(f"No profile found for {name.title()} (OAID: {oaid}). Please check the data.")
             print("Feedback: No")  # Debug print
-            profiles_df.loc[profiles_df['oaid'] == oaid, 'input'] = "No"
-            profiles_df.to_csv('authors_profiles.csv', index=False)
-            print("Saved 'No' feedback to CSV.")  # Debug print
+            profileStore.update_profiles({oaid: {'input': "No"}}, filename)
+            print("Saved 'No' feedback.")  # Debug print
 
             st.sidebar.success("Thank you for your feedback!")
             st.session_state.no_confirmed = True
@@ -252,9 +236,8 @@ with tab_csv:
 with tab_graph:
     st.header("Cluster Visualisation")
 
-    # Load CSV and embeddings data
-    try:
-        data = pd.read_csv('authors_profiles.csv')
-    except FileNotFoundError:
+    # Load profiles and embeddings data
+    data = profileStore.read_profiles(filename)
+    if data.empty:
         st.error("No profiles found. Please add profiles first.")
         st.stop()
@@ -0,0 +1,176 @@
+import argparse
+import json
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+import metrics
+import paperStore
+import profileStore
+from fetchPapers import fetch_author_papers
+from nameSearch import get_author_name, search_openalex_id
+from profileWriter import profile_from_papers
+
+# File paths
+output_csv = 'authors_profiles.csv'
+json_file = 'authors_papers.json'
+
+institution = 'Imperial College London'
+
+oaid_pattern = re.compile(r'^(https://openalex\.org/)?A\d+$', re.IGNORECASE)
+
+def read_entries(input_file):
+    """
+    Read one author per line from a file of names or OpenAlex IDs.
+
+    Blank lines and lines starting with '#' are ignored.
+    """
+    entries = []
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                entries.append(line)
+    return entries
+
+def resolve_entry(entry):
+    """
+    Resolve a name or OpenAlex ID to an (oaid, name) pair.
+    """
+    if oaid_pattern.match(entry):
+        oaid = paperStore.normalize_oaid(entry)
+        return oaid, get_author_name(oaid)
+
+    oaid = search_openalex_id(entry)
+    if oaid is None:
+        raise ValueError(f"No OpenAlex author found for '{entry}'.")
+    return oaid, entry
+
+def ingest(entries, csv_file=output_csv, json_file=json_file,
+           resolve_workers=4, fetch_workers=4, profile_workers=2, force=False):
+    """
+    Resolve, fetch and profile many authors with bounded concurrency per stage.
+
+    Each entry moves through three stages, each backed by its own thread pool:
+    OpenAlex author resolution, paper fetching and LLM profile generation.
+    All paper and profile store writes happen on the calling thread.
+
+    Args:
+        entries (list): Author names or OpenAlex IDs.
+        csv_file (str): Path to the legacy profiles CSV (the profile store sits next to it).
+        json_file (str): Path to the legacy papers JSON (the paper store sits next to it).
+        resolve_workers (int): Concurrent OpenAlex author searches.
+        fetch_workers (int): Concurrent OpenAlex paper fetches.
+        profile_workers (int): Concurrent LLM requests.
+        force (bool): Regenerate profiles for authors that already have one.
+
+    Returns:
+        dict: Lists of 'done' authors and 'failed' (entry, stage, error) tuples.
+    """
+    existing = profileStore.read_profiles(csv_file)
+    profiled = set(existing.loc[existing['profile_llm'].notna(), 'oaid'].astype(str))
+    existing_rows = {row['oaid']: row for row in existing.to_dict('records')}
+
+    conn = paperStore.open_for_json(json_file)
+    done, failed, rows = [], [], []
+    total = len(entries)
+    start_time = time.time()
+
+    resolve_pool = ThreadPoolExecutor(max_workers=resolve_workers)
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers)
+    profile_pool = ThreadPoolExecutor(max_workers=profile_workers)
+    pending = {}
+
+    def report():
+        elapsed = time.time() - start_time
+        print(f"[{len(done) + len(failed)}/{total}] done {len(done)}, failed {len(failed)}, "
+              f"in flight {len(pending)} ({elapsed:.0f}s)")
+
+    try:
+        for entry in entries:
+            pending[resolve_pool.submit(resolve_entry, entry)] = ('resolve', entry, None)
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, entry, author = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed.append((entry, stage, str(e)))
+                    report()
+                    continue
+
+                if stage == 'resolve':
+                    oaid, name = result
+                    author = {'oaid': oaid, 'name': name}
+                    if oaid in profiled and not force:
+                        done.append(author)
+                        report()
+                        continue
+                    stored = paperStore.get_author(conn, oaid)
+                    if stored is not None:
+                        author['papers'] = stored['papers']
+                        pending[profile_pool.submit(profile_from_papers, stored['papers'], name)] = ('profile', entry, author)
+                    else:
+                        # Taken before the fetch, so works updated while it runs are picked up by the next refresh
+                        author['synced_at'] = paperStore.utc_now()
+                        pending[fetch_pool.submit(fetch_author_papers, oaid, json_file=json_file)] = ('fetch', entry, author)
+
+                elif stage == 'fetch':
+                    papers, _ = result
+                    author['papers'] = papers
+                    paperStore.upsert_author(conn, author['oaid'], author['name'], papers, synced_at=author['synced_at'])
+                    pending[profile_pool.submit(profile_from_papers, papers, author['name'])] = ('profile', entry, author)
+
+                elif stage == 'profile':
+                    profile_text, classification = result
+                    row = dict(existing_rows.get(author['oaid'], {}))
+                    row.update({
+                        'oaid': author['oaid'],
+                        'profile_llm': profile_text,
+                        'classification': json.dumps(classification),
+                    })
+                    if pd.isna(row.get('name')):
+                        row['name'] = author['name']
+                    if pd.isna(row.get('institution')):
+                        row['institution'] = institution
+                    rows.append(row)
+                    done.append(author)
+                    report()
+
+        # Bring the metrics of the authors just stored up to date
+        metrics.update_metrics(conn)
+    finally:
+        for pool in (resolve_pool, fetch_pool, profile_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+        conn.close()
+        if rows:
+            profileStore.upsert_profiles(rows, csv_file)
+
+    return {'done': done, 'failed': failed}
+
+def print_summary(result):
+    print(f"\nIngested {len(result['done'])} authors, {len(result['failed'])} failed.")
+    for entry, stage, error in result['failed']:
+        print(f"  {entry}: failed at {stage} stage: {error}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Add many researchers from a file of names or OpenAlex IDs.")
+    parser.add_argument('input_file', help="File with one author name or OpenAlex ID per line.")
+    parser.add_argument('--csv', default=output_csv)
+    parser.add_argument('--json', default=json_file)
+    parser.add_argument('--resolve-workers', type=int, default=4)
+    parser.add_argument('--fetch-workers', type=int, default=4)
+    parser.add_argument('--profile-workers', type=int, default=2)
+    parser.add_argument('--force', action='store_true', help="Regenerate profiles that already exist.")
+    args = parser.parse_args()
+
+    result = ingest(
+        read_entries(args.input_file), csv_file=args.csv, json_file=args.json,
+        resolve_workers=args.resolve_workers, fetch_workers=args.fetch_workers,
+        profile_workers=args.profile_workers, force=args.force,
+    )
+    print_summary(result)
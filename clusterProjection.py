@@ -0,0 +1,140 @@
+import os
+
+import joblib
+import numpy as np
+from sklearn.cluster import KMeans
+
+# File paths
+projection_file = "cluster_projection.joblib"
+
+# Projection settings
+n_clusters = 3
+n_neighbors = 15
+min_dist = 0.1
+random_state = 42
+
+# Drift thresholds that trigger a full refit
+max_new_fraction = 0.25  # share of points placed with transform since the last fit
+max_distance_ratio = 1.5  # mean centroid distance of new points relative to the fitted points
+
+class ClusterProjection:
+    """
+    Persisted UMAP reducer and KMeans model for the profile map.
+
+    The models are fitted once on the embedding store and saved with joblib.
+    Authors added later are placed with reducer.transform and kmeans.predict,
+    so existing points keep their coordinates and clusters between views. A
+    full refit only happens on request or when the new points drift too far
+    from the fitted ones.
+    """
+
+    def __init__(self):
+        self.reducer = None
+        self.kmeans = None
+        self.model = None
+        self.fitted_count = 0
+        self.fitted_distance = 0.0
+        self.placed = {}  # key -> (row, x, y, cluster)
+        self.new_count = 0
+        self.new_distance = 0.0
+
+    def fit(self, records, embeddings, model=None):
+        """
+        Fit the reducer and clusters on all embeddings and reset the drift counters.
+        """
+        # Imported here as UMAP is slow to import
+        from umap.umap_ import UMAP
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.reducer = UMAP(n_neighbors=n_neighbors, min_dist=min_dist, n_components=2, random_state=random_state)
+        coordinates = self.reducer.fit_transform(embeddings)
+        self.kmeans = KMeans(n_clusters=n_clusters, random_state=random_state)
+        labels = self.kmeans.fit_predict(embeddings)
+
+        self.model = model
+        self.fitted_count = len(records)
+        self.fitted_distance = float(self.kmeans.transform(embeddings).min(axis=1).mean())
+        self.placed = {
+            entry["key"]: (entry["row"], float(x), float(y), int(label))
+            for entry, (x, y), label in zip(records, coordinates, labels)
+        }
+        self.new_count = 0
+        self.new_distance = 0.0
+
+    def place(self, records, embeddings):
+        """
+        Project new embeddings into the fitted layout and assign their clusters.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        coordinates = self.reducer.transform(embeddings)
+        labels = self.kmeans.predict(embeddings)
+        distances = self.kmeans.transform(embeddings).min(axis=1)
+
+        total = self.new_distance * self.new_count + float(distances.sum())
+        self.new_count += len(records)
+        self.new_distance = total / self.new_count
+        for entry, (x, y), label in zip(records, coordinates, labels):
+            self.placed[entry["key"]] = (entry["row"], float(x), float(y), int(label))
+
+    def drift(self):
+        """
+        Return (share of points placed since the fit, their mean centroid distance relative to the fit).
+        """
+        new_fraction = self.new_count / max(self.fitted_count + self.new_count, 1)
+        distance_ratio = self.new_distance / self.fitted_distance if self.new_count and self.fitted_distance else 0.0
+        return new_fraction, distance_ratio
+
+    def needs_refit(self, model=None):
+        if self.reducer is None or self.model != model:
+            return True
+        new_fraction, distance_ratio = self.drift()
+        return new_fraction > max_new_fraction or distance_ratio > max_distance_ratio
+
+    def save(self, path=projection_file):
+        joblib.dump(self, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path=projection_file):
+        if os.path.exists(path):
+            try:
+                return joblib.load(path)
+            except Exception as e:
+                print(f"Could not load {path} ({e}); refitting.")
+        return cls()
+
+def project(embedding_store, model=None, refit=False, path=projection_file):
+    """
+    Return 2-D coordinates and cluster labels for every stored embedding.
+
+    Points already placed are reused as they are; unseen or re-embedded
+    authors are placed with the fitted models. The models are refitted when
+    refit is True, when none are saved, when the embedding model changed or
+    when drift crosses the thresholds above.
+
+    Returns:
+        tuple: (records, coordinates array of shape (n, 2), cluster labels array).
+    """
+    records = embedding_store.records()
+    projection = ClusterProjection.load(path)
+
+    if refit or projection.needs_refit(model):
+        print(f"Fitting UMAP and KMeans on {len(records)} embeddings.")
+        projection.fit(records, embedding_store.vectors(records), model=model)
+        projection.save(path)
+    else:
+        pending = [
+            entry for entry in records
+            if projection.placed.get(entry["key"], (None,))[0] != entry["row"]
+        ]
+        if pending:
+            projection.place(pending, embedding_store.vectors(pending))
+            if projection.needs_refit(model):
+                print(f"Drift threshold crossed, refitting on {len(records)} embeddings.")
+                projection.fit(records, embedding_store.vectors(records), model=model)
+            projection.save(path)
+
+    placed = [projection.placed[entry["key"]] for entry in records]
+    coordinates = np.array([(x, y) for _, x, y, _ in placed], dtype=np.float32).reshape(-1, 2)
+    labels = np.array([label for *_, label in placed], dtype=int)
+    return records, coordinates, labels
@@ -1,111 +1,211 @@
+import argparse
+import os
+import threading
+import time
+from types import SimpleNamespace
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from umap.umap_ import UMAP  # Correct UMAP import
-import json
+import torch
 from bokeh.plotting import figure, show
 from bokeh.models import ColumnDataSource, HoverTool
-from transformers import AutoTokenizer
-from adapters import AutoAdapterModel
+import clusterProjection
+import profileStore
+from embeddingStore import EmbeddingStore
 
 # File paths
 csv_file = "authors_profiles.csv"
-embeddings_file = "embeddings.json"
+embeddings_file = "embeddings.json"  # legacy JSON store, migrated on first load
+embeddings_prefix = "embeddings"  # embeddings.f32 + embeddings_index.jsonl
 
-# Load or initialize CSV
-try:
-    data = pd.read_csv(csv_file)
-except FileNotFoundError:
-    data = pd.DataFrame(columns=["name", "oaid", "profile_llm", "profile_llm_human", "classification"])
+# Recorded with each embedding so vectors from different models are not mixed
+model_version = "allenai/specter2_base+specter2_classification"
 
-# Load or initialize embeddings JSON
-try:
-    with open(embeddings_file, "r") as f:
-        embeddings_data = json.load(f)
-except FileNotFoundError:
-    embeddings_data = {}
+# Load the profiles from the profile store
+data = profileStore.read_profiles(csv_file, columns=["name", "oaid", "profile_llm", "profile_llm_human", "classification"])
+
+# Load or initialize the embedding store
+embedding_store = EmbeddingStore(embeddings_prefix)
+if len(embedding_store) == 0 and os.path.exists(embeddings_file):
+    # Legacy embeddings were computed with the fp32 model
+    embedding_store.migrate_from_json(embeddings_file, model=f"{model_version}/fp32")
 
 # Load SPECTER2 model and tokenizer
 def load_specter2_model():
+    # Imported here so that importing this module stays cheap
+    from transformers import AutoTokenizer
+    from adapters import AutoAdapterModel
+
     tokenizer = AutoTokenizer.from_pretrained("allenai/specter2_base")
     model = AutoAdapterModel.from_pretrained("allenai/specter2_base")
     model.load_adapter("allenai/specter2_classification", source="hf", load_as="specter2", set_active=True)
+    model.eval()
     return tokenizer, model
 
-tokenizer, model = load_specter2_model()
+# Inference backend: fp32 (default), int8 (dynamically quantized Linear layers) or onnx (onnxruntime)
+embedding_backend = os.getenv("SPECTER2_BACKEND", "fp32")
+embedding_backends = ("fp32", "int8", "onnx")
+onnx_model_file = "specter2.onnx"
+parity_min_cosine = 0.99  # lowest cosine similarity to fp32 accepted from the int8 and onnx backends
+
+_specter2 = {}
+_specter2_lock = threading.Lock()
+
+class OnnxEncoder:
+    """
+    Runs an exported SPECTER2 encoder with onnxruntime behind the same call
+    signature as the torch model: model(**inputs).last_hidden_state.
+    """
+
+    def __init__(self, model, tokenizer, path=onnx_model_file):
+        import onnxruntime
+
+        if not os.path.exists(path):
+            export_onnx(model, tokenizer, path)
+        options = onnxruntime.SessionOptions()
+        if torch_threads > 0:
+            options.intra_op_num_threads = torch_threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        (last_hidden_state,) = self.session.run(
+            ["last_hidden_state"],
+            {"input_ids": input_ids.numpy(), "attention_mask": attention_mask.numpy()}
+        )
+        return SimpleNamespace(last_hidden_state=torch.from_numpy(last_hidden_state))
+
+def export_onnx(model, tokenizer, path=onnx_model_file):
+    """
+    Export the SPECTER2 encoder (with its active adapter) to ONNX.
+    """
+    class Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    sample = tokenizer(["SPECTER2 export"], return_tensors="pt", return_token_type_ids=False)
+    torch.onnx.export(
+        Encoder(model), (sample["input_ids"], sample["attention_mask"]), path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "last_hidden_state": {0: "batch", 1: "sequence"},
+        },
+        opset_version=17,
+    )
+
+def get_specter2(backend=None):
+    """
+    Return the process-wide (tokenizer, model) for a backend, loading it on first use.
+    """
+    backend = backend or embedding_backend
+    if backend not in embedding_backends:
+        raise ValueError(f"Backend must be one of {', '.join(embedding_backends)}.")
+
+    with _specter2_lock:
+        if "fp32" not in _specter2:
+            _specter2["fp32"] = load_specter2_model()
+        if backend not in _specter2:
+            tokenizer, model = _specter2["fp32"]
+            if backend == "int8":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            else:
+                model = OnnxEncoder(model, tokenizer)
+            _specter2[backend] = (tokenizer, model)
+        return _specter2[backend]
+
+def backend_model_version(backend=None):
+    return f"{model_version}/{backend or embedding_backend}"
+
+# Embedding settings
+embedding_batch_size = 16
+torch_threads = int(os.getenv("TORCH_NUM_THREADS", "0"))  # 0 keeps torch's default
+if torch_threads > 0:
+    torch.set_num_threads(torch_threads)
+
+# Generate embeddings for many profiles in length-sorted batches
+def generate_embeddings(texts, batch_size=embedding_batch_size, backend=None):
+    tokenizer, model = get_specter2(backend)
+    for text in texts:
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError("Text input must be a non-empty string.")
+
+    # Sort by token length so each batch is only padded to its own longest text
+    lengths = [len(ids) for ids in tokenizer(texts, truncation=True, max_length=512)["input_ids"]]
+    order = sorted(range(len(texts)), key=lambda i: lengths[i])
+
+    embeddings = [None] * len(texts)
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            inputs = tokenizer(
+                [texts[i] for i in batch],
+                padding=True,
+                truncation=True,
+                return_tensors="pt",
+                return_token_type_ids=False,
+                max_length=512
+            )
+            output = model(**inputs)
+            batch_embeddings = output.last_hidden_state[:, 0, :].numpy()
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding.tolist()
+    return embeddings
 
 # Generate embedding for a single profile
 def generate_embedding(text):
-    if not isinstance(text, str) or not text.strip():
-        raise ValueError("Text input must be a non-empty string.")
-    
-    text_batch = [text]
-    inputs = tokenizer(
-        text_batch, 
-        padding=True, 
-        truncation=True, 
-        return_tensors="pt", 
-        return_token_type_ids=False, 
-        max_length=512
-    )
-    output = model(**inputs)
-    embedding = output.last_hidden_state[:, 0, :].detach().numpy().flatten()
-    return embedding.tolist()
+    return generate_embeddings([text])[0]
 
 # Update embeddings for new entries
 def update_embeddings(data):
-    updated = False
-    for index, row in data.iterrows():
-        oaid = row["oaid"]
-        name = row["name"]
-        classification = row.get("classification", "Unknown")  # Default if classification is missing
+    # Use profile_llm_human if available, otherwise fallback to profile_llm
+    profile_texts = data["profile_llm_human"].where(data["profile_llm_human"].notna(), data["profile_llm"])
+    classifications = data["classification"] if "classification" in data else pd.Series("Unknown", index=data.index)
+
+    model = backend_model_version()
+    pending = []
+    for oaid, name, classification, profile_text in zip(data["oaid"], data["name"], classifications, profile_texts):
         key = f"{oaid}_{name}"
 
-        # Check if embedding already exists
-        if key in embeddings_data:
+        # Check if an embedding from the current backend already exists; others are re-embedded
+        stored = embedding_store.index.get(key)
+        if stored is not None and stored.get("model") == model:
             continue
 
-        # Use profile_llm_human if available, otherwise fallback to profile_llm
-        profile_text = row["profile_llm_human"] if pd.notna(row["profile_llm_human"]) else row["profile_llm"]
-
         if isinstance(profile_text, str) and profile_text.strip():
-            try:
-                embedding = generate_embedding(profile_text)
-                embeddings_data[key] = {
-                    "oaid": oaid,
-                    "name": name,
-                    "classification": classification,
-                    "embedding": embedding,
-                }
-                updated = True
-            except ValueError as e:
-                print(f"Skipping row {index}: {e}")
-    
-    # Save updated embeddings to JSON
-    if updated:
-        with open(embeddings_file, "w") as f:
-            json.dump(embeddings_data, f, indent=4)
-    return embeddings_data
+            pending.append((key, oaid, name, classification, profile_text))
+
+    # Embed all new profiles in one batched pass and append them to the store
+    if pending:
+        embeddings = generate_embeddings([profile_text for *_, profile_text in pending])
+        embedding_store.add_many([
+            (key, embedding, {
+                "oaid": oaid,
+                "name": name,
+                "classification": classification,
+                "model": model,
+            })
+            for (key, oaid, name, classification, _), embedding in zip(pending, embeddings)
+        ])
+    return embedding_store
 
 # Visualize clusters
-def visualize_clusters(data, embeddings_data):
+def visualize_clusters(data, embedding_store, refit=False):
     # Check if the DataFrame is empty
     if data.empty:
         st.error("No data available for visualization.")
         return None
 
-    # Prepare embeddings and metadata
-    embeddings = np.array([e["embedding"] for e in embeddings_data.values()])
-    names = [e["name"] for e in embeddings_data.values()]
-    classifications = [e.get("classification", "Unknown") for e in embeddings_data.values()]
-
-    # Reduce dimensionality with UMAP
-    reducer = UMAP(n_neighbors=15, min_dist=0.1, n_components=2, random_state=42)
-    reduced_embeddings = reducer.fit_transform(embeddings)
-
-    # Perform clustering
-    kmeans = KMeans(n_clusters=3, random_state=42)
-    cluster_labels = kmeans.fit_predict(embeddings)
+    # Project with the persisted UMAP and KMeans models; only new authors are placed
+    records, reduced_embeddings, cluster_labels = clusterProjection.project(
+        embedding_store, model=backend_model_version(), refit=refit
+    )
+    names = [e["name"] for e in records]
+    classifications = [e.get("classification", "Unknown") for e in records]
 
     # Determine the latest entry
     latest_name = data.iloc[-1]["name"] if not data.empty else None
@@ -137,4 +237,51 @@ def visualize_clusters(data, embeddings_data):
     hover.tooltips = [("Name", "@name"), ("Classification", "@classification"), ("Cluster", "@cluster")]
     plot.add_tools(hover)
 
-    return plot
\ No newline at end of file
+    return plot
+
+# Compare the quantized and ONNX backends against fp32 embeddings
+def compare_backends(texts, backends=("int8", "onnx"), batch_size=embedding_batch_size):
+    """
+    Report cosine similarity to the fp32 embeddings and the speedup of each backend.
+
+    Returns:
+        dict: backend -> {'mean_cosine', 'min_cosine', 'seconds', 'speedup'}.
+    """
+    def timed(backend):
+        get_specter2(backend)  # exclude loading and export from the timing
+        start = time.perf_counter()
+        embeddings = np.asarray(generate_embeddings(texts, batch_size=batch_size, backend=backend))
+        return embeddings, time.perf_counter() - start
+
+    reference, reference_seconds = timed("fp32")
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    report = {"fp32": {"mean_cosine": 1.0, "min_cosine": 1.0, "seconds": reference_seconds, "speedup": 1.0}}
+
+    for backend in backends:
+        embeddings, seconds = timed(backend)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        cosine = np.sum(reference * embeddings, axis=1)
+        report[backend] = {
+            "mean_cosine": float(cosine.mean()),
+            "min_cosine": float(cosine.min()),
+            "seconds": seconds,
+            "speedup": reference_seconds / seconds,
+        }
+
+    for backend, result in report.items():
+        print(f"{backend}: mean cosine {result['mean_cosine']:.4f}, min cosine {result['min_cosine']:.4f}, "
+              f"{result['seconds']:.2f}s, {result['speedup']:.2f}x")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check embedding backends against fp32 on the stored profiles.")
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"], choices=["int8", "onnx"])
+    parser.add_argument("--min-cosine", type=float, default=parity_min_cosine, help="Fail if any embedding falls below this similarity.")
+    args = parser.parse_args()
+
+    profile_texts = data["profile_llm_human"].where(data["profile_llm_human"].notna(), data["profile_llm"])
+    texts = [text for text in profile_texts if isinstance(text, str) and text.strip()]
+    report = compare_backends(texts, backends=args.backends)
+    failed = [backend for backend in args.backends if report[backend]["min_cosine"] < args.min_cosine]
+    if failed:
+        raise SystemExit(f"Backends below parity threshold {args.min_cosine}: {', '.join(failed)}")
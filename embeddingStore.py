@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+class EmbeddingStore:
+    """
+    Append-only float32 matrix of embeddings with a sidecar key index.
+
+    Vectors live in '<prefix>.f32' as raw float32 rows and are read back through
+    a memory map. '<prefix>_index.jsonl' holds one JSON line per stored row with
+    its key, row number and metadata (oaid, name, classification, model version).
+    Adding an embedding appends one row and one index line; re-adding a key
+    points it at a new row, and compact() drops the superseded rows.
+
+    Writes are serialised by a lock, so one store can be shared by threads
+    (e.g. Streamlit sessions using the same module-level store).
+    """
+
+    def __init__(self, prefix="embeddings", dim=768):
+        self.matrix_file = f"{prefix}.f32"
+        self.index_file = f"{prefix}_index.jsonl"
+        self.dim = dim
+        self.index = {}
+        self.rows = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def _complete_rows(self, f):
+        # Count the whole rows of the open matrix file, cutting off a partly written last row
+        row_bytes = self.dim * 4
+        size = os.fstat(f.fileno()).st_size
+        if size % row_bytes:
+            f.truncate(size - size % row_bytes)
+        return size // row_bytes
+
+    def _load(self):
+        if os.path.exists(self.matrix_file):
+            with open(self.matrix_file, "r+b") as f:
+                self.rows = self._complete_rows(f)
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = json.loads(line)
+                    # Ignore index lines whose row never made it to the matrix file
+                    if entry["row"] < self.rows:
+                        self.index[entry["key"]] = entry
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return list(self.index)
+
+    def add(self, key, embedding, **metadata):
+        """
+        Append one embedding with its metadata.
+        """
+        self.add_many([(key, embedding, metadata)])
+
+    def add_many(self, items):
+        """
+        Append several (key, embedding, metadata) items with one write per file.
+        """
+        if not items:
+            return
+        vectors = np.asarray([embedding for _, embedding, _ in items], dtype=np.float32)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embeddings must have {self.dim} dimensions, got {vectors.shape[1]}.")
+
+        with self._lock:
+            # Rows are numbered from the file itself, which may have grown since it was loaded
+            with open(self.matrix_file, "ab") as f:
+                first_row = self._complete_rows(f)
+                f.write(vectors.tobytes())
+            entries = [
+                dict(metadata, key=key, row=first_row + offset)
+                for offset, (key, _, metadata) in enumerate(items)
+            ]
+            with open(self.index_file, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+            self.rows = first_row + len(items)
+            for entry in entries:
+                self.index[entry["key"]] = entry
+
+    def matrix(self):
+        """
+        Return every stored row as a read-only memory map (no copy).
+        """
+        if self.rows == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self.matrix_file, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+
+    def records(self):
+        """
+        Return the index entries of the current embeddings in row order.
+        """
+        return sorted(self.index.values(), key=lambda entry: entry["row"])
+
+    def vectors(self, records=None):
+        """
+        Return the embeddings for the given records (default: all current ones).
+
+        When no rows have been superseded this is the memory map itself.
+        """
+        records = self.records() if records is None else records
+        matrix = self.matrix()
+        rows = [entry["row"] for entry in records]
+        if rows == list(range(self.rows)):
+            return matrix
+        return matrix[rows]
+
+    def get(self, key):
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        return self.matrix()[entry["row"]]
+
+    def compact(self):
+        """
+        Rewrite both files keeping only the current row for each key.
+        """
+        with self._lock:
+            records = self.records()
+            vectors = np.array(self.vectors(records), dtype=np.float32)
+            entries = [dict(entry, row=row) for row, entry in enumerate(records)]
+
+            with open(self.matrix_file + ".tmp", "wb") as f:
+                f.write(vectors.tobytes())
+            with open(self.index_file + ".tmp", "w", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(self.matrix_file + ".tmp", self.matrix_file)
+            os.replace(self.index_file + ".tmp", self.index_file)
+
+            self.rows = len(entries)
+            self.index = {entry["key"]: entry for entry in entries}
+
+    def migrate_from_json(self, json_file, model=None):
+        """
+        Import an embeddings.json file ({key: {oaid, name, classification, embedding}}).
+
+        Keys already in the store are skipped.
+
+        Returns:
+            int: The number of embeddings imported.
+        """
+        with open(json_file, "r") as f:
+            embeddings_data = json.load(f)
+        items = [
+            (key, entry["embedding"], {
+                "oaid": entry.get("oaid"),
+                "name": entry.get("name"),
+                "classification": entry.get("classification", "Unknown"),
+                "model": model,
+            })
+            for key, entry in embeddings_data.items() if key not in self.index
+        ]
+        self.add_many(items)
+        return len(items)
@@ -1,113 +1,287 @@
-from itertools import chain
-import json
-import os
-import pandas as pd
-from pyalex import Works
+from datetime import date
 
-def fetch_papers_and_update_json(input_csv, output_json):
+import pyalex
+from openalexCache import Works
+import metrics
+import paperStore
+import profileStore
+from nameSearch import institution_id
+
+# File paths
+json_file = 'authors_papers.json'
+
+# Only the fields paper_from_work reads are requested from OpenAlex
+work_fields = [
+    'id', 'doi', 'primary_topic', 'publication_year', 'cited_by_count',
+    'title', 'abstract_inverted_index', 'corresponding_author_ids',
+]
+
+# Fields of the first, light pass: enough to refresh a work the paper store already holds
+light_fields = ['id', 'publication_year', 'cited_by_count', 'corresponding_author_ids']
+
+# Work IDs OR-ed into one filter when downloading full records (OpenAlex allows up to 100)
+ids_per_request = 50
+
+def collect_pages(query, build):
     """
-    Fetch papers for authors in the input CSV and update the JSON file.
+    Paginate a Works query, taking the result count from the first page.
+
+    Stops as soon as every counted result has been read, which avoids both a
+    separate count() request and the trailing empty cursor page.
 
     Args:
-        input_csv (str): Path to the input CSV file with 'oaid' and 'name' columns.
-        output_json (str): Path to the output JSON file where data will be updated.
+        query: The pyalex query to paginate.
+        build (callable): Called with each work; its return value is collected unless None.
 
     Returns:
-        dict: The author data and the result count.
+        tuple: The list of built records and the result count.
     """
-    # Check if the JSON file exists and is valid
-    if not os.path.exists(output_json) or os.path.getsize(output_json) == 0:
-        print(f"Initializing JSON file at {output_json}")
-        with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump([], f)
+    records = []
+    result_count = None
+    works_read = 0
+    for page in query.paginate(method='cursor', per_page=200, n_max=None):
+        if result_count is None:
+            result_count = page.meta['count']
+        for item in page:
+            record = build(item)
+            if record is not None:
+                records.append(record)
+        works_read += len(page)
+        if works_read >= result_count:
+            break
+    return records, result_count or 0
 
-    try:
-        # Load the existing JSON data
-        with open(output_json, 'r', encoding='utf-8') as f:
-            output_data = json.load(f)
-    except json.JSONDecodeError:
-        print(f"Error reading JSON file at {output_json}. Reinitializing.")
-        with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump([], f)
-        output_data = []
+def paper_from_work(item, oaid):
+    """
+    Build the stored paper record for an OpenAlex work.
+
+    Args:
+        item (dict): A work returned by the OpenAlex Works API.
+        oaid (str): The OpenAlex ID of the author the paper is stored under.
+
+    Returns:
+        dict: The paper fields kept in the paper store.
+    """
+    return {
+        'id': item['id'],
+        'doi': item['doi'],
+        'topic_id': item['primary_topic']['id'] if item['primary_topic'] else None,
+        'publication_year': item['publication_year'],
+        'cited_by_count': item['cited_by_count'],
+        'title': item['title'],
+        'abstract': item['abstract'],
+        'citations_per_year': citations_per_year(item['cited_by_count'], item['publication_year']),
+        'is_corresponding_author': oaid in item['corresponding_author_ids'],
+    }
+
+def citations_per_year(cited_by_count, publication_year, current_year=None):
+    """
+    Return a work's citations per year since publication, counting at least one year.
+    """
+    current_year = current_year or date.today().year
+    return round(float(cited_by_count) / max((current_year - float(publication_year)), 1), 2)
+
+def refreshed_paper(work, item, oaid):
+    """
+    Update a stored work with the counts of a light OpenAlex record.
+
+    Args:
+        work (dict): The work as held in the paper store.
+        item (dict): A work from the light pass (light_fields only).
+        oaid (str): The OpenAlex ID of the author the paper is stored under.
+    """
+    return dict(
+        work,
+        publication_year=item['publication_year'],
+        cited_by_count=item['cited_by_count'],
+        citations_per_year=citations_per_year(item['cited_by_count'], item['publication_year']),
+        is_corresponding_author=oaid in item['corresponding_author_ids'],
+    )
+
+def fetch_works_by_id(work_ids):
+    """
+    Download full records for works by OpenAlex ID, several works per request.
+
+    Returns:
+        dict: Work ID to its OpenAlex record.
+    """
+    work_ids = list(work_ids)
+    works = {}
+    for start in range(0, len(work_ids), ids_per_request):
+        query = Works().filter(openalex_id='|'.join(work_ids[start:start + ids_per_request])).select(work_fields)
+        collect_pages(query, lambda item: works.__setitem__(item['id'], item))
+    return works
+
+def complete_works(items, json_file=json_file):
+    """
+    Split light records into works the paper store holds and works to download in full.
+
+    Only works missing from the store (or stored without an abstract) are downloaded.
 
+    Returns:
+        tuple: Stored works by ID and full OpenAlex records by ID for the others.
+    """
+    work_ids = list(dict.fromkeys(item['id'] for item in items))
+    conn = paperStore.open_for_json(json_file)
     try:
-        # Load the CSV with authors
-        df = pd.read_csv(input_csv)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"The file {input_csv} does not exist. Please ensure it contains 'oaid' and 'name' columns.")
+        held = {work_id: work for work_id, work in paperStore.get_works(conn, work_ids).items() if work['abstract']}
+    finally:
+        conn.close()
+
+    fetched = fetch_works_by_id([work_id for work_id in work_ids if work_id not in held])
+    print(f"{len(held)} of {len(work_ids)} works already stored, downloaded {len(fetched)} full records.")
+    return held, fetched
+
+def paper_for(item, oaid, held, fetched):
+    """
+    Build the paper record of a light work for an author from the stored or downloaded work.
+    """
+    if item['id'] in held:
+        return refreshed_paper(held[item['id']], item, oaid)
+    if item['id'] in fetched:
+        return paper_from_work(fetched[item['id']], oaid)
+    return None
 
-    # Ensure required columns exist in the DataFrame
-    if 'oaid' not in df.columns or 'name' not in df.columns:
-        raise ValueError(f"The file {input_csv} must contain 'oaid' and 'name' columns.")
+def fetch_author_papers(oaid, since=None, json_file=json_file):
+    """
+    Fetch the papers of a single author from OpenAlex.
 
-    # Get the latest entry from the CSV
-    latest_entry = df.iloc[-1]
-    oaid_url = latest_entry['oaid']
-    print(oaid_url)
-    author_name = latest_entry['name']
-    oaid = oaid_url
+    A light first pass lists the author's works with their citation counts;
+    full records (with abstracts) are only downloaded for works the paper store
+    does not hold yet, e.g. papers co-authored with an author already tracked.
 
-    print(f"Fetching papers for the latest author: {author_name} (OAID: {oaid})")
+    Args:
+        oaid (str): The OpenAlex ID of the author.
+        since (str): Optional ISO date. Only works created or updated on or after
+            this date are fetched. The OpenAlex from_updated_date filter needs an
+            API key (pyalex.config.api_key); without one the full list is fetched.
+        json_file (str): Path to the legacy JSON file the paper store sits next to.
+
+    Returns:
+        tuple: The list of paper records and the result count.
+    """
+    # corresponding_author_ids holds full OpenAlex URLs, so compare against the canonical form
+    oaid = paperStore.normalize_oaid(oaid)
 
     # Define the query for the specific author
     query = Works().filter(
         type='article|preprint|book-chapter|dissertation'
     ).filter(
-        authorships={"author": {'id': oaid_url}}
+        authorships={"author": {'id': oaid}}
     ).filter(
         publication_year='>2010'
     ).filter(
         has_abstract='True'
     )
+    if since and pyalex.config.api_key:
+        query = query.filter(from_updated_date=since[:10])
+    query = query.select(light_fields)
 
-    result_count = query.count()
+    items, result_count = collect_pages(query, lambda item: item)
+    held, fetched = complete_works(items, json_file)
+    papers = [paper for paper in (paper_for(item, oaid, held, fetched) for item in items) if paper is not None]
     print(f"Number of filtered results for OAID {oaid}: {result_count}")
 
-    # Collect papers if results exist
-    papers = []
-    if result_count > 0:
-        for item in chain(*query.paginate(per_page=200, n_max=None)):
-            paper_data = {
-                'id': item['id'],
-                'doi': item['doi'],
-                'topic_id': item['primary_topic']['id'] if item['primary_topic'] else None,
-                'publication_year': item['publication_year'],
-                'cited_by_count': item['cited_by_count'],
-                'title': item['title'],
-                'abstract': item['abstract'],
-                'citations_per_year': round(
-                    float(item['cited_by_count']) /
-                    max((2026 - float(item['publication_year'])), 1), 2
-                ),
-                'is_corresponding_author': oaid_url in item['corresponding_author_ids'],
-            }
-            papers.append(paper_data)
-
-    # Load existing JSON or initialize empty structure
+    return papers, result_count
+
+def harvest_institution(tracked_oaids, institution=institution_id, json_file=json_file):
+    """
+    Sweep all works of an institution once and split them into per-author paper lists.
+
+    Uses cursor pagination over a single Works query instead of one query per author.
+    Only authors in tracked_oaids are kept. Works an author published while at
+    another institution are not part of the sweep. As in fetch_author_papers,
+    the sweep reads light records and full ones are only downloaded for works
+    the paper store does not hold.
+
+    Args:
+        tracked_oaids (iterable): OpenAlex IDs of the authors we track.
+        institution (str): OpenAlex ID of the institution to sweep.
+        json_file (str): Path to the legacy JSON file the paper store sits next to.
+
+    Returns:
+        tuple: A dict mapping OAID to its list of paper records, and the number of works scanned.
+    """
+    tracked_oaids = set(tracked_oaids)
+    papers_by_author = {oaid: {} for oaid in tracked_oaids}
+
+    query = Works().filter(
+        type='article|preprint|book-chapter|dissertation'
+    ).filter(
+        authorships={"institutions": {'id': institution}}
+    ).filter(
+        publication_year='>2010'
+    ).filter(
+        has_abstract='True'
+    )
+
+    def tracked_authorships(item):
+        # Keep only the works with a tracked author, and only those authors
+        oaids = [(authorship.get('author') or {}).get('id') for authorship in item['authorships']]
+        oaids = [oaid for oaid in oaids if oaid in tracked_oaids]
+        return (item, oaids) if oaids else None
+
+    tracked_items, works_scanned = collect_pages(query.select(light_fields + ['authorships']), tracked_authorships)
+    print(f"Harvested {works_scanned} works for institution {institution}")
+
+    held, fetched = complete_works([item for item, _ in tracked_items], json_file)
+    for item, oaids in tracked_items:
+        for oaid in oaids:
+            paper = paper_for(item, oaid, held, fetched)
+            if paper is not None:
+                papers_by_author[oaid][item['id']] = paper
+
+    return {oaid: list(papers.values()) for oaid, papers in papers_by_author.items()}, works_scanned
+
+def fetch_papers_for_oaid(oaid, name=None, json_file=json_file):
+    """
+    Return an author's papers, fetching and storing them if the paper store does not hold them yet.
+
+    Args:
+        oaid (str): The author's OpenAlex ID.
+        name (str): The author's name, stored with newly fetched papers.
+        json_file (str): Path to the legacy JSON file the paper store sits next to.
+
+    Returns:
+        tuple: The author data (dict with 'oaid', 'name' and 'papers') and the result count.
+    """
+    oaid = paperStore.normalize_oaid(oaid)
+    conn = paperStore.open_for_json(json_file)
     try:
-        with open(output_json, 'r', encoding='utf-8') as f:
-            output_data = json.load(f)
-    except FileNotFoundError:
-        output_data = []
-
-    # Check if the author already exists in the JSON
-    author_exists = any(author['oaid'] == oaid for author in output_data)
-
-    if author_exists:
-        print(f"Author {author_name} (OAID: {oaid}) already exists in the JSON.")
-    else:
-        # Add the latest author's data to the JSON structure
-        output_data.append({
-            'oaid': oaid,
-            'name': author_name,
-            'papers': papers
-        })
-
-        # Save the updated JSON file
-        with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=4, ensure_ascii=False)
-
-        print(f"Updated JSON with {author_name} (OAID: {oaid}).")
-
-    return {'oaid': oaid, 'name': author_name, 'papers': papers}, result_count
\ No newline at end of file
+        # Check if the author already exists in the store before any network work
+        if paperStore.author_exists(conn, oaid):
+            stored = paperStore.get_author(conn, oaid)
+            print(f"Author {name or stored['name']} (OAID: {oaid}) already exists in the paper store.")
+            return {'oaid': oaid, 'name': name or stored['name'], 'papers': stored['papers']}, len(stored['papers'])
+
+        print(f"Fetching papers for {name} (OAID: {oaid})")
+        synced_at = paperStore.utc_now()
+        papers, result_count = fetch_author_papers(oaid, json_file=json_file)
+
+        paperStore.upsert_author(conn, oaid, name, papers, synced_at=synced_at)
+        metrics.update_metrics(conn)
+        print(f"Updated paper store with {name} (OAID: {oaid}).")
+    finally:
+        conn.close()
+
+    return {'oaid': oaid, 'name': name, 'papers': papers}, result_count
+
+def fetch_papers_and_update_json(input_csv, output_json):
+    """
+    Fetch papers for the latest author in the profile store and update the paper store.
+
+    Kept for existing callers; fetch_papers_for_oaid works for any author.
+
+    Args:
+        input_csv (str): Path to the legacy profiles CSV; profiles are kept in the
+            SQLite store next to it.
+        output_json (str): Path to the legacy JSON file. Papers are kept in the SQLite
+            store next to it, which is migrated from this file on first use.
+
+    Returns:
+        dict: The author data and the result count.
+    """
+    latest_entry = profileStore.latest_profile(input_csv)
+    if latest_entry is None:
+        raise ValueError(f"The profile store for {input_csv} has no authors.")
+    return fetch_papers_for_oaid(latest_entry['oaid'], latest_entry['name'], output_json)
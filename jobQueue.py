@@ -0,0 +1,202 @@
+import sqlite3
+import threading
+import time
+import traceback
+
+import paperStore
+import profileStore
+from fetchPapers import fetch_papers_for_oaid
+from nameSearch import search_openalex_id
+from profileWriter import generate_profile_for_oaid
+
+# File paths
+jobs_file = 'jobs.db'
+output_csv = 'authors_profiles.csv'
+json_file = 'authors_papers.json'
+
+# Job statuses, in pipeline order
+job_statuses = ('queued', 'fetching', 'profiling', 'done', 'failed')
+
+_workers = []
+_workers_lock = threading.Lock()
+
+def connect(db_file=jobs_file):
+    """
+    Open the job table, creating it if needed.
+    """
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            oaid TEXT,
+            institution TEXT,
+            email TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result_count INTEGER,
+            profile TEXT,
+            error TEXT,
+            created REAL NOT NULL,
+            updated REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+    conn.commit()
+    return conn
+
+def enqueue(name, oaid=None, institution=None, email=None, db_file=jobs_file):
+    """
+    Queue a search-and-generate job for an author.
+
+    Args:
+        name (str): The author's name.
+        oaid (str): Optional OpenAlex ID; when missing it is resolved from the name.
+
+    Returns:
+        int: The job ID.
+    """
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("Name must be a non-empty string.")
+    oaid = paperStore.normalize_oaid(oaid) if oaid and oaid.strip() else None
+    now = time.time()
+    conn = connect(db_file)
+    try:
+        cursor = conn.execute(
+            "INSERT INTO jobs (name, oaid, institution, email, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            (name.strip(), oaid, institution, email or None, now, now)
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def get_job(job_id, db_file=jobs_file):
+    """
+    Return a job as a dict, or None if it does not exist.
+    """
+    conn = connect(db_file)
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def recent_jobs(limit=10, db_file=jobs_file):
+    """
+    Return the most recently created jobs, newest first.
+    """
+    conn = connect(db_file)
+    try:
+        return [dict(row) for row in conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+    finally:
+        conn.close()
+
+def update_job(conn, job_id, **fields):
+    fields['updated'] = time.time()
+    assignments = ", ".join(f"{key} = ?" for key in fields)
+    conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+
+def claim_next(conn):
+    """
+    Atomically move the oldest queued job to 'fetching' and return it.
+    """
+    row = conn.execute(
+        """
+        UPDATE jobs SET status = 'fetching', updated = ?
+        WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+        RETURNING *
+        """,
+        (time.time(),)
+    ).fetchone()
+    conn.commit()
+    return dict(row) if row else None
+
+def requeue_interrupted(db_file=jobs_file):
+    """
+    Put jobs left in 'fetching' or 'profiling' by a stopped process back in the queue.
+    """
+    conn = connect(db_file)
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', profile = NULL, updated = ? WHERE status IN ('fetching', 'profiling')",
+            (time.time(),)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def stream_into_job(conn, job_id, interval=0.5):
+    """
+    Build a stream_handler that saves the partial profile to the job as it streams.
+    """
+    def handler(chunks):
+        text, last_saved = "", 0.0
+        for chunk in chunks:
+            text += chunk
+            if time.time() - last_saved > interval:
+                update_job(conn, job_id, profile=text)
+                last_saved = time.time()
+        return text
+    return handler
+
+def run_job(conn, job, csv_file=output_csv, json_file=json_file):
+    """
+    Resolve the author, fetch their papers and generate their profile.
+    """
+    name, oaid = job['name'], job['oaid']
+
+    # Resolve the OpenAlex ID, reusing the stored one for a known name
+    if not oaid:
+        known = profileStore.find_by_name(name, csv_file)
+        oaid = known['oaid'] if known else None
+    if not oaid:
+        oaid = search_openalex_id(name)
+    if not oaid:
+        raise ValueError(f"No OpenAlex author found for {name}.")
+    oaid = paperStore.normalize_oaid(oaid)
+    update_job(conn, job['id'], oaid=oaid)
+    profileStore.upsert_profile(oaid, {'name': name, 'institution': job['institution'], 'email': job['email']}, csv_file)
+
+    # Fetch papers unless they are already stored
+    author, _ = fetch_papers_for_oaid(oaid, name, json_file)
+
+    update_job(conn, job['id'], status='profiling', result_count=len(author['papers']))
+    result = generate_profile_for_oaid(oaid, json_file, csv_file, stream_handler=stream_into_job(conn, job['id']))
+    if result is None:
+        raise ValueError(f"No papers stored for {name} (OAID: {oaid}).")
+    update_job(conn, job['id'], status='done', profile=result[0])
+
+def worker_loop(db_file=jobs_file, poll_interval=1.0):
+    conn = connect(db_file)
+    while True:
+        job = claim_next(conn)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        try:
+            run_job(conn, job)
+        except Exception as e:
+            traceback.print_exc()
+            update_job(conn, job['id'], status='failed', error=str(e))
+
+def start_workers(count=2, db_file=jobs_file):
+    """
+    Start the background worker threads once per process.
+
+    Jobs interrupted by a previous process are requeued first.
+
+    Returns:
+        list: The worker threads.
+    """
+    with _workers_lock:
+        if not _workers:
+            requeue_interrupted(db_file)
+            for _ in range(count):
+                worker = threading.Thread(target=worker_loop, args=(db_file,), daemon=True)
+                worker.start()
+                _workers.append(worker)
+    return _workers
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Cache settings, overridable through environment variables
+cache_file = os.getenv("LLM_CACHE_FILE", ".cache/llm.db")
+cache_enabled = os.getenv("LLM_CACHE", "on") != "off"
+max_entries = 20000
+max_age_days = 90
+
+def cache_key(model, system_prompt, prompt, params):
+    """
+    Hash everything that determines a completion into a content address.
+
+    Args:
+        model (str): The model name.
+        system_prompt (str): The system message (pre_prompt).
+        prompt (str): The rendered user prompt.
+        params (dict): Sampling parameters such as max_tokens and temperature.
+    """
+    payload = json.dumps(
+        {'model': model, 'system': system_prompt, 'prompt': prompt, 'params': params},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class CompletionCache:
+    """
+    Persistent, content-addressed cache of LLM completions.
+
+    Entries older than max_age_days are ignored and removed; beyond max_entries
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=cache_file, enabled=cache_enabled, max_entries=max_entries, max_age_days=max_age_days):
+        self.path = path
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        """
+        Return the cached completion for a key, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT content, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            content, created = row
+            now = time.time()
+            if now - created > self.max_age:
+                conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                conn.commit()
+                return None
+
+            conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return content
+
+    def put(self, key, model, content):
+        """
+        Store a completion and evict the least recently used entries beyond max_entries.
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """
+                INSERT INTO completions (key, model, content, created, accessed) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    content = excluded.content, created = excluded.created, accessed = excluded.accessed
+                """,
+                (key, model, content, now, now)
+            )
+            conn.execute("DELETE FROM completions WHERE created < ?", (now - self.max_age,))
+            conn.execute(
+                """
+                DELETE FROM completions WHERE key IN (
+                    SELECT key FROM completions ORDER BY accessed DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM completions")
+            self._connection().commit()
+
+completion_cache = CompletionCache()
+
+def set_cache(cache):
+    """
+    Replace the process-wide completion cache, e.g. with a different file.
+    """
+    global completion_cache
+    completion_cache = cache
@@ -0,0 +1,198 @@
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import paperStore
+
+# File paths
+json_file = 'authors_papers.json'
+
+# Citations of works published in the last recent_years years count as recent
+recent_years = 5
+
+metric_columns = [
+    "works", "h_index", "i10_index", "total_citations", "recent_citations",
+    "output_per_year", "corresponding_share", "first_year",
+]
+
+def ensure_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS author_metrics (
+            oaid TEXT PRIMARY KEY,
+            works INTEGER,
+            h_index INTEGER,
+            i10_index INTEGER,
+            total_citations INTEGER,
+            recent_citations INTEGER,
+            output_per_year REAL,
+            corresponding_share REAL,
+            first_year INTEGER,
+            reference_year INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS metrics_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO metrics_meta (key, value) VALUES ('version', 0)")
+    conn.commit()
+
+def compute_metrics(papers, current_year=None):
+    """
+    Compute per-author bibliometrics from a table of author-work rows in one pass.
+
+    Args:
+        papers (DataFrame): One row per author and work with 'oaid', 'publication_year',
+            'cited_by_count' and 'is_corresponding_author'.
+        current_year (int): Reference year for recent citations and output per year.
+
+    Returns:
+        DataFrame: One row per author, indexed by 'oaid', with metric_columns.
+    """
+    current_year = current_year or date.today().year
+    if papers.empty:
+        return pd.DataFrame(columns=metric_columns, index=pd.Index([], name="oaid"))
+
+    cited = papers["cited_by_count"].fillna(0).to_numpy(dtype=np.int64)
+    year = papers["publication_year"].to_numpy(dtype=np.float64)
+    table = pd.DataFrame({
+        "oaid": papers["oaid"].to_numpy(),
+        "cited": cited,
+        "year": year,
+        "corresponding": papers["is_corresponding_author"].fillna(0).to_numpy(dtype=np.int64),
+        "cited_10": (cited >= 10).astype(np.int64),
+        "recent_cited": np.where(year > current_year - recent_years, cited, 0),
+    })
+
+    # h-index: rank each author's works by citations; h is the last rank still covered by its citations
+    table = table.sort_values(["oaid", "cited"], ascending=[True, False], kind="stable")
+    table["rank"] = table.groupby("oaid", sort=False).cumcount() + 1
+    table["covered"] = np.where(table["cited"].to_numpy() >= table["rank"].to_numpy(), table["rank"].to_numpy(), 0)
+
+    grouped = table.groupby("oaid", sort=True)
+    metrics = grouped.agg(
+        works=("cited", "size"),
+        h_index=("covered", "max"),
+        i10_index=("cited_10", "sum"),
+        total_citations=("cited", "sum"),
+        recent_citations=("recent_cited", "sum"),
+        corresponding_share=("corresponding", "mean"),
+        first_year=("year", "min"),
+    )
+    active_years = np.maximum(current_year - metrics["first_year"].fillna(current_year) + 1, 1)
+    metrics["output_per_year"] = metrics["works"] / active_years
+    metrics["first_year"] = metrics["first_year"].astype("Int64")
+    return metrics[metric_columns]
+
+def update_metrics(conn, current_year=None):
+    """
+    Recompute the metrics of authors whose papers changed since their last computation.
+
+    Authors are flagged by the paper store whenever their works, or works they
+    share with another author, are written. All flags are recomputed when the
+    reference year changes. Called by the paper-store writers after they commit;
+    the metrics version is bumped whenever authors were recomputed.
+
+    Returns:
+        int: The number of authors whose metrics were recomputed.
+    """
+    current_year = current_year or date.today().year
+    ensure_table(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            """
+            UPDATE authors SET metrics_stale = 1
+            WHERE oaid IN (SELECT oaid FROM author_metrics WHERE reference_year != ?)
+            """,
+            (current_year,)
+        )
+        stale = [row[0] for row in conn.execute("SELECT oaid FROM authors WHERE metrics_stale = 1")]
+        if not stale:
+            conn.rollback()
+            return 0
+
+        papers = pd.read_sql_query(
+            """
+            SELECT author_works.oaid, works.publication_year, works.cited_by_count,
+                   author_works.is_corresponding_author
+            FROM authors
+            JOIN author_works ON author_works.oaid = authors.oaid
+            JOIN works ON works.id = author_works.work_id
+            WHERE authors.metrics_stale = 1
+            """,
+            conn
+        )
+        metrics = compute_metrics(papers, current_year).reindex(stale)
+        metrics["works"] = metrics["works"].fillna(0)
+
+        columns = ["oaid"] + metric_columns + ["reference_year"]
+        records = metrics.astype(object).where(metrics.notna(), None).rename_axis("oaid").reset_index().to_dict("records")
+        rows = [tuple(record[column] for column in columns[:-1]) + (current_year,) for record in records]
+        conn.executemany(
+            f"INSERT OR REPLACE INTO author_metrics ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows
+        )
+        conn.execute("UPDATE authors SET metrics_stale = 0 WHERE metrics_stale = 1")
+        conn.execute("UPDATE metrics_meta SET value = value + 1 WHERE key = 'version'")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(stale)
+
+def _has_table(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+def metrics_version(json_file=json_file):
+    """
+    Return a counter that changes whenever metrics are recomputed, for cache keys.
+    """
+    conn = paperStore.open_for_json(json_file)
+    try:
+        if not _has_table(conn, "metrics_meta"):
+            return 0
+        return conn.execute("SELECT value FROM metrics_meta WHERE key = 'version'").fetchone()[0]
+    finally:
+        conn.close()
+
+def get_metrics(oaids=None, json_file=json_file):
+    """
+    Read the metrics table as last updated by the paper-store writers.
+
+    Args:
+        oaids (list): Optional OAIDs to restrict the result to.
+
+    Returns:
+        DataFrame: One row per author, indexed by 'oaid'.
+    """
+    conn = paperStore.open_for_json(json_file)
+    try:
+        if not _has_table(conn, "author_metrics"):
+            return pd.DataFrame(columns=metric_columns, index=pd.Index([], name="oaid"))
+        query = f"SELECT oaid, {', '.join(metric_columns)} FROM author_metrics"
+        params = []
+        if oaids is not None:
+            oaids = [paperStore.normalize_oaid(oaid) for oaid in oaids]
+            query += f" WHERE oaid IN ({', '.join('?' * len(oaids))})"
+            params = oaids
+        return pd.read_sql_query(query, conn, params=params, index_col="oaid")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update and show the per-author metrics table.")
+    parser.add_argument("--json", default=json_file)
+    parser.add_argument("--all", action="store_true", help="Recompute every author, not only stale ones.")
+    args = parser.parse_args()
+
+    conn = paperStore.open_for_json(args.json)
+    try:
+        if args.all:
+            conn.execute("UPDATE authors SET metrics_stale = 1")
+            conn.commit()
+        print(f"Recomputed metrics for {update_metrics(conn)} authors.")
+    finally:
+        conn.close()
+    print(get_metrics(json_file=args.json).to_string())
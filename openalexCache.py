@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import pyalex
+from pyalex.api import OpenAlexResponseList
+
+# Cache settings, overridable through environment variables
+cache_file = os.getenv("OPENALEX_CACHE_FILE", ".cache/openalex.db")
+cache_mode = os.getenv("OPENALEX_CACHE", "readwrite")  # off | readwrite | record | replay
+max_cache_bytes = 256 * 1024 * 1024
+
+# Time-to-live per OpenAlex endpoint, in seconds
+endpoint_ttl = {
+    'authors': 7 * 24 * 3600,
+    'works': 24 * 3600,
+}
+default_ttl = 24 * 3600
+
+cache_modes = ('off', 'readwrite', 'record', 'replay')
+
+def normalize_query(url):
+    """
+    Normalise an OpenAlex request URL into a cache key.
+
+    Query parameters and filter clauses are sorted so that the same query built
+    in a different order maps to the same key. Authentication and contact
+    parameters are dropped.
+    """
+    parsed = urlparse(url)
+    params = []
+    for key, value in parse_qsl(parsed.query, keep_blank_values=True):
+        if key in ('api_key', 'mailto'):
+            continue
+        if key == 'filter':
+            value = ','.join(sorted(clause.strip() for clause in value.split(',')))
+        params.append((key, value.strip()))
+    return f"{parsed.path.strip('/').lower()}?{urlencode(sorted(params))}"
+
+class ResponseCache:
+    """
+    SQLite-backed cache of OpenAlex responses with per-endpoint TTL and LRU eviction.
+
+    Modes:
+        off: every request goes to the network.
+        readwrite: fresh entries are served from the cache, misses are fetched and stored.
+        record: every request goes to the network and the response is stored.
+        replay: responses are only served from the cache, ignoring TTL; misses raise LookupError.
+    """
+
+    def __init__(self, path=cache_file, mode=cache_mode, ttl=None, max_bytes=max_cache_bytes):
+        if mode not in cache_modes:
+            raise ValueError(f"Cache mode must be one of {', '.join(cache_modes)}.")
+        self.path = path
+        self.mode = mode
+        self.ttl = dict(endpoint_ttl, **(ttl or {}))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key, endpoint):
+        """
+        Return the cached payload for a key, or None if missing or expired.
+        """
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT payload, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            payload, created = row
+            now = time.time()
+            if self.mode != 'replay' and now - created > self.ttl.get(endpoint, default_ttl):
+                return None
+
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return json.loads(payload)
+
+    def put(self, key, endpoint, payload):
+        """
+        Store a payload and evict the least recently used entries beyond max_bytes.
+        """
+        data = json.dumps(payload, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """
+                INSERT INTO responses (key, endpoint, payload, size, created, accessed)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    payload = excluded.payload, size = excluded.size,
+                    created = excluded.created, accessed = excluded.accessed
+                """,
+                (key, endpoint, data, len(data), now, now)
+            )
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in conn.execute(
+                    "SELECT key, size FROM responses WHERE key != ? ORDER BY accessed", (key,)
+                ).fetchall():
+                    conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM responses")
+            self._connection().commit()
+
+    def fetch(self, url, fetch, resource_class):
+        """
+        Serve a request from the cache or the network according to the cache mode.
+
+        Args:
+            url (str): The OpenAlex request URL, including pagination parameters.
+            fetch (callable): Performs the real request and returns the pyalex result.
+            resource_class: The pyalex entity class used to rebuild cached results.
+        """
+        if self.mode == 'off':
+            return fetch()
+
+        key = normalize_query(url)
+        endpoint = key.split('?', 1)[0].split('/', 1)[0]
+
+        if self.mode in ('readwrite', 'replay'):
+            payload = self.get(key, endpoint)
+            if payload is not None:
+                return _from_payload(payload, resource_class)
+            if self.mode == 'replay':
+                raise LookupError(f"No recorded OpenAlex response for {key}.")
+
+        result = fetch()
+        self.put(key, endpoint, _to_payload(result))
+        return result
+
+def _to_payload(result):
+    if isinstance(result, OpenAlexResponseList):
+        return {'results': [dict(item) for item in result], 'meta': result.meta}
+    return {'entity': dict(result)}
+
+def _from_payload(payload, resource_class):
+    if 'entity' in payload:
+        return resource_class(payload['entity'])
+    return OpenAlexResponseList(payload['results'], payload['meta'], resource_class)
+
+response_cache = ResponseCache()
+
+def set_cache(cache):
+    """
+    Replace the process-wide response cache, e.g. with a different file or mode.
+    """
+    global response_cache
+    response_cache = cache
+
+class CachedQuery:
+    """
+    Mixin routing pyalex requests through the process-wide response cache.
+    """
+
+    def _get_from_url(self, url, session=None):
+        return response_cache.fetch(
+            url, lambda: super(CachedQuery, self)._get_from_url(url, session), self.resource_class
+        )
+
+# Drop-in replacements for the pyalex query classes. The class names must match
+# pyalex's, as they determine the API path.
+class Works(CachedQuery, pyalex.Works):
+    pass
+
+class Authors(CachedQuery, pyalex.Authors):
+    pass
@@ -0,0 +1,241 @@
+import argparse
+import json
+from pathlib import Path
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+import paperSelection
+import paperStore
+
+# File paths
+json_file = 'authors_papers.json'
+
+# Number of abstracts read from the store per query when papers are materialised
+abstract_batch_size = paperSelection.max_papers
+
+class PaperCorpus:
+    """
+    Columnar, read-only view of the paper store.
+
+    Works are held once as typed arrays: publication year, citation count and
+    citations per year as numbers, topic as a categorical, IDs and titles as
+    interned strings. Author-work links are integer arrays grouped by author,
+    so an author's works are a contiguous slice. Abstracts stay in the store
+    and are only read, by work ID, for the papers that are actually used.
+    """
+
+    def __init__(self, conn, oaids=None):
+        """
+        Load the corpus from a paper store connection.
+
+        Args:
+            conn (sqlite3.Connection): An open connection to the paper store.
+            oaids (list): Optional OAIDs to restrict the corpus to their works.
+        """
+        # Abstracts are read later through a read-only connection of our own, opened on first use
+        self.db_file = paperStore.store_file_of(conn)
+        self._reader = None
+        works, links, authors = self._read(conn, oaids)
+
+        # One row per work
+        self.work_ids = np.array([sys.intern(work_id) for work_id in works['id']], dtype=object)
+        self.titles = np.array([sys.intern(title) if isinstance(title, str) else "" for title in works['title']], dtype=object)
+        self.topics = pd.Categorical(works['topic_id'])
+        self.publication_year = works['publication_year'].fillna(0).to_numpy(dtype=np.int16)  # 0 when unknown
+        self.cited_by_count = works['cited_by_count'].fillna(0).to_numpy(dtype=np.int32)
+        self.citations_per_year = works['citations_per_year'].fillna(0).to_numpy(dtype=np.float32)
+        self.has_abstract = works['has_abstract'].fillna(0).to_numpy(dtype=bool)
+
+        # One row per author-work link, grouped by author in insertion order
+        authors_index = pd.Index(authors['oaid'])
+        link_authors = authors_index.get_indexer(links['oaid']).astype(np.int32)
+        link_works = pd.Index(self.work_ids).get_indexer(links['work_id']).astype(np.int32)
+        link_corresponding = links['is_corresponding_author'].fillna(0).to_numpy(dtype=bool)
+        known = (link_authors >= 0) & (link_works >= 0)
+        order = np.argsort(link_authors[known], kind='stable')
+        self.link_author = link_authors[known][order]
+        self.link_work = link_works[known][order]
+        self.link_corresponding = link_corresponding[known][order]
+
+        # One row per author; offsets[i]:offsets[i + 1] are the links of author i
+        self.oaids = authors_index
+        self.names = authors['name'].to_numpy(dtype=object)
+        self.offsets = np.searchsorted(self.link_author, np.arange(len(authors_index) + 1)).astype(np.int64)
+
+    @staticmethod
+    def _read(conn, oaids):
+        if oaids is None:
+            author_filter, params = "", ()
+        else:
+            author_filter, params = "WHERE oaid IN (SELECT value FROM json_each(?))", (json.dumps(list(oaids)),)
+        authors = pd.read_sql_query(f"SELECT oaid, name FROM authors {author_filter} ORDER BY oaid", conn, params=params)
+        links = pd.read_sql_query(
+            f"SELECT oaid, work_id, is_corresponding_author FROM author_works {author_filter} ORDER BY rowid",
+            conn, params=params
+        )
+        work_filter = "" if oaids is None else f"WHERE id IN (SELECT work_id FROM author_works {author_filter})"
+        works = pd.read_sql_query(
+            f"""
+            SELECT id, topic_id, publication_year, cited_by_count, citations_per_year, title,
+                   abstract IS NOT NULL AND abstract != '' AS has_abstract
+            FROM works {work_filter}
+            """,
+            conn, params=params
+        )
+        return works, links, authors
+
+    def __len__(self):
+        return len(self.work_ids)
+
+    def __contains__(self, oaid):
+        return oaid in self.oaids
+
+    def _links(self, oaid):
+        position = self.oaids.get_loc(oaid)
+        return slice(self.offsets[position], self.offsets[position + 1])
+
+    def author_name(self, oaid):
+        return self.names[self.oaids.get_loc(oaid)]
+
+    def author_works(self, oaid):
+        """
+        Return an author's work rows and whether they are its corresponding author.
+
+        Returns:
+            tuple: (int array of work rows, bool array), in the order the works were stored.
+        """
+        links = self._links(oaid)
+        return self.link_work[links], self.link_corresponding[links]
+
+    def ranked_rows(self, oaid, current_year=None):
+        """
+        Rank an author's works that have an abstract with paperSelection's score, best first.
+
+        Returns:
+            tuple: (int array of work rows, bool array of corresponding authorship).
+        """
+        rows, corresponding = self.author_works(oaid)
+        keep = self.has_abstract[rows]
+        rows, corresponding = rows[keep], corresponding[keep]
+        scores = paperSelection.rank_scores(
+            self.citations_per_year[rows], self.publication_year[rows], corresponding, current_year
+        )
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], corresponding[order]
+
+    def ranked_papers(self, oaid, current_year=None):
+        """
+        Return an author's ranked papers with abstracts, read from the store only as they are iterated.
+        """
+        rows, corresponding = self.ranked_rows(oaid, current_year)
+        return LazyPapers(self, rows, corresponding)
+
+    def papers(self, rows, corresponding=None):
+        """
+        Materialise work rows as paper records, reading their abstracts and DOIs from the store.
+
+        Returns:
+            list: Paper records in the layout of paperStore.get_author.
+        """
+        works = paperStore.get_works(self._read_connection(), self.work_ids[rows])
+        papers = []
+        for position, row in enumerate(rows):
+            paper = dict(works[self.work_ids[row]])
+            if corresponding is not None:
+                paper['is_corresponding_author'] = bool(corresponding[position])
+            papers.append(paper)
+        return papers
+
+    def _read_connection(self):
+        # Only SELECTs run on it, so it may be shared with the threads that iterate papers
+        if self._reader is None:
+            self._reader = sqlite3.connect(Path(self.db_file).as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+            self._reader.row_factory = sqlite3.Row
+        return self._reader
+
+    def close(self):
+        """
+        Close the connection used to read abstracts.
+        """
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def works_frame(self):
+        """
+        Return the works as a DataFrame of the typed columns, for vectorised filters and sorts.
+        """
+        return pd.DataFrame({
+            'id': self.work_ids,
+            'title': self.titles,
+            'topic_id': self.topics,
+            'publication_year': self.publication_year,
+            'cited_by_count': self.cited_by_count,
+            'citations_per_year': self.citations_per_year,
+            'has_abstract': self.has_abstract,
+        })
+
+    def links_frame(self):
+        """
+        Return one row per author and work with the columns metrics.compute_metrics expects.
+        """
+        year = self.publication_year[self.link_work].astype(np.float32)
+        year[year == 0] = np.nan
+        return pd.DataFrame({
+            'oaid': pd.Categorical.from_codes(self.link_author, categories=self.oaids),
+            'publication_year': year,
+            'cited_by_count': self.cited_by_count[self.link_work],
+            'is_corresponding_author': self.link_corresponding,
+        })
+
+    def nbytes(self):
+        """
+        Estimate the memory held by the corpus arrays, strings included.
+        """
+        arrays = [
+            self.publication_year, self.cited_by_count, self.citations_per_year, self.has_abstract,
+            self.link_author, self.link_work, self.link_corresponding, self.offsets, self.topics.codes,
+        ]
+        strings = set(self.work_ids) | set(self.titles) | set(self.topics.categories) | set(self.oaids)
+        return sum(array.nbytes for array in arrays) + sum(sys.getsizeof(text) for text in strings)
+
+class LazyPapers:
+    """
+    Ranked paper records of one author whose abstracts are read from the store in
+    small batches while iterating, so selections that stop early read few abstracts.
+    """
+
+    def __init__(self, corpus, rows, corresponding):
+        self.corpus = corpus
+        self.rows = rows
+        self.corresponding = corresponding
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        for start in range(0, len(self.rows), abstract_batch_size):
+            end = start + abstract_batch_size
+            yield from self.corpus.papers(self.rows[start:end], self.corresponding[start:end])
+
+def load(json_file=json_file, oaids=None):
+    """
+    Load the corpus of the paper store that replaces the given authors_papers JSON file.
+    """
+    conn = paperStore.open_for_json(json_file)
+    try:
+        return PaperCorpus(conn, oaids)
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load the paper store into columnar arrays and report their size.")
+    parser.add_argument('--json', default=json_file)
+    args = parser.parse_args()
+
+    corpus = load(args.json)
+    print(f"{len(corpus)} works, {len(corpus.link_work)} author-work links and {len(corpus.oaids)} authors "
+          f"in {corpus.nbytes() / 2**20:.1f} MiB.")
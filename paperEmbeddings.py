@@ -0,0 +1,130 @@
+import argparse
+import hashlib
+
+import numpy as np
+
+import clustering
+import paperStore
+from embeddingStore import EmbeddingStore
+
+# File paths
+json_file = 'authors_papers.json'
+paper_embeddings_prefix = "paper_embeddings"  # one row per OpenAlex work
+author_embeddings_prefix = "author_embeddings"  # one row per author, aggregated from their papers
+
+# Number of paper texts embedded per flush; bounds the memory held at once
+chunk_size = 256
+
+paper_store = EmbeddingStore(paper_embeddings_prefix)
+author_store = EmbeddingStore(author_embeddings_prefix)
+
+def paper_text(paper):
+    """
+    Return the SPECTER2 input for a paper: title and abstract joined by the separator token.
+    """
+    title = paper.get('title') or ""
+    abstract = paper.get('abstract') or ""
+    if not abstract:
+        return title
+    tokenizer, _ = clustering.get_specter2()
+    return title + tokenizer.sep_token + abstract
+
+def works_signature(papers):
+    """
+    Hash the work IDs and citation weights of an author's papers, so the author
+    vector is only recomputed when either changes.
+    """
+    digest = hashlib.sha1()
+    for paper in sorted(papers, key=lambda paper: paper['id']):
+        digest.update(f"{paper['id']}:{paper.get('citations_per_year') or 0}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def author_vector(papers):
+    """
+    Average an author's paper embeddings weighted by citations per year.
+
+    One is added to each weight so that recent, not yet cited papers still count.
+    """
+    vectors = paper_store.vectors([paper_store.index[paper['id']] for paper in papers])
+    weights = np.array([(paper.get('citations_per_year') or 0) + 1 for paper in papers], dtype=np.float32)
+    return weights @ vectors / weights.sum()
+
+def _flush(pending, authors, model):
+    # Embed the pending papers, then aggregate the buffered authors
+    if pending:
+        embeddings = clustering.generate_embeddings([paper_text(paper) for paper in pending.values()])
+        paper_store.add_many([
+            (work_id, embedding, {"model": model})
+            for work_id, embedding in zip(pending, embeddings)
+        ])
+
+    author_store.add_many([
+        (author['oaid'], author_vector(papers), {
+            "oaid": author['oaid'],
+            "name": author['name'],
+            "works": len(papers),
+            "signature": signature,
+            "model": model,
+        })
+        for author, papers, signature in authors
+    ])
+
+def update_author_embeddings(json_file=json_file):
+    """
+    Embed new papers in the paper store and refresh the author vectors built from them.
+
+    Authors are streamed from the store and buffered until chunk_size new papers
+    or authors are pending, so only one chunk of texts and vectors is held in
+    memory. Papers already embedded with the current model are never embedded again, and an
+    author is only re-aggregated when their works or citation counts changed.
+
+    Returns:
+        tuple: (papers embedded, authors updated).
+    """
+    model = clustering.backend_model_version()
+    embedded, updated = 0, 0
+    pending, authors = {}, []
+
+    conn = paperStore.open_for_json(json_file)
+    try:
+        for author in paperStore.iter_authors(conn):
+            papers = [paper for paper in author['papers'] if paper.get('id') and paper.get('title')]
+            if not papers:
+                continue
+
+            signature = works_signature(papers)
+            stored = author_store.index.get(author['oaid'])
+            if stored is not None and stored.get("signature") == signature and stored.get("model") == model:
+                continue
+
+            for paper in papers:
+                entry = paper_store.index.get(paper['id'])
+                if (entry is None or entry.get("model") != model) and paper['id'] not in pending:
+                    pending[paper['id']] = paper
+            authors.append((author, papers, signature))
+
+            if len(pending) >= chunk_size or len(authors) >= chunk_size:
+                _flush(pending, authors, model)
+                embedded, updated = embedded + len(pending), updated + len(authors)
+                pending, authors = {}, []
+                print(f"Embedded {embedded} papers, updated {updated} authors.")
+    finally:
+        conn.close()
+
+    if authors:
+        _flush(pending, authors, model)
+        embedded, updated = embedded + len(pending), updated + len(authors)
+
+    print(f"Embedded {embedded} new papers and updated {updated} author vectors.")
+    return embedded, updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed stored papers and aggregate them into author vectors.")
+    parser.add_argument("--json", default=json_file)
+    parser.add_argument("--compact", action="store_true", help="Drop superseded rows from both embedding files afterwards.")
+    args = parser.parse_args()
+
+    update_author_embeddings(args.json)
+    if args.compact:
+        paper_store.compact()
+        author_store.compact()
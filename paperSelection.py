@@ -0,0 +1,125 @@
+from datetime import date
+
+import numpy as np
+
+# Selection settings
+token_budget = 3000
+max_papers = 10
+tokenizer_model = "gpt-4o"
+
+# Ranking weights: citation impact, recency and corresponding authorship
+citation_weight = 0.6
+recency_weight = 0.3
+corresponding_weight = 0.1
+recency_window = 10  # years over which the recency score decays to zero
+
+_encoding = None
+_encoding_loaded = False
+
+def get_encoding():
+    """
+    Load the tiktoken encoding for the profile model once, or None if unavailable.
+
+    tiktoken downloads its vocabulary on first use, so this can fail offline;
+    callers then fall back to a character-based estimate.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(tokenizer_model)
+        except Exception as e:
+            print(f"Tokenizer unavailable ({e}); estimating tokens from text length.")
+            _encoding = None
+    return _encoding
+
+def count_tokens(text):
+    """
+    Count the tokens of a text with the model's tokenizer.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+def truncate_to_tokens(text, limit):
+    """
+    Cut a text down to at most limit tokens, marking the cut with an ellipsis.
+    """
+    if limit <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        if len(text) <= limit * 4:
+            return text
+        return text[:limit * 4].rsplit(' ', 1)[0] + "..."
+    tokens = encoding.encode(text)
+    if len(tokens) <= limit:
+        return text
+    return encoding.decode(tokens[:limit]).rsplit(' ', 1)[0] + "..."
+
+def rank_scores(citations_per_year, publication_year, corresponding, current_year=None):
+    """
+    Score papers from column arrays by citations per year, recency and corresponding authorship.
+
+    Citations per year are log-scaled and normalised by the best paper so that a
+    single highly cited paper does not swamp the ranking. Unknown years are 0.
+
+    Returns:
+        ndarray: One score per paper; higher is better.
+    """
+    current_year = current_year or date.today().year
+    impact = np.log1p(np.nan_to_num(np.asarray(citations_per_year, dtype=np.float64)))
+    best_impact = (impact.max() if impact.size else 0) or 1
+    year = np.nan_to_num(np.asarray(publication_year, dtype=np.float64))
+    age = current_year - np.where(year > 0, year, current_year - recency_window)
+    recency = np.maximum(0.0, 1 - age / recency_window)
+    corresponding = np.asarray(corresponding, dtype=bool)
+    return citation_weight * impact / best_impact + recency_weight * recency + corresponding_weight * corresponding
+
+def rank_papers(papers, current_year=None):
+    """
+    Order paper records by rank_scores, best first.
+    """
+    scores = rank_scores(
+        [paper.get('citations_per_year') or 0 for paper in papers],
+        [paper.get('publication_year') or 0 for paper in papers],
+        [bool(paper.get('is_corresponding_author')) for paper in papers],
+        current_year
+    )
+    return [papers[i] for i in np.argsort(-scores, kind='stable')]
+
+def select_papers(papers, token_budget=token_budget, max_papers=max_papers, ranked=False):
+    """
+    Pick the strongest papers whose titles and abstracts fit in a token budget.
+
+    Papers are taken in ranked order; the abstract of the last paper that does not
+    fit entirely is truncated to the remaining budget. With ranked set, papers are
+    taken to be ranked and to have abstracts already (e.g. paperCorpus.ranked_papers)
+    and are only iterated as far as the budget goes.
+
+    Returns:
+        list: (title, abstract) pairs to include in the prompt.
+    """
+    selected = []
+    remaining = token_budget
+    if not ranked:
+        papers = rank_papers([paper for paper in papers if paper.get('abstract')])
+    for paper in papers:
+        if len(selected) >= max_papers or remaining <= 0:
+            break
+
+        title = paper['title'] or ""
+        entry_tokens = count_tokens(f"Title: {title}\nAbstract: ")
+        abstract_tokens = count_tokens(paper['abstract'])
+        if entry_tokens + abstract_tokens <= remaining:
+            selected.append((title, paper['abstract']))
+            remaining -= entry_tokens + abstract_tokens
+        else:
+            abstract = truncate_to_tokens(paper['abstract'], remaining - entry_tokens)
+            if abstract:
+                selected.append((title, abstract))
+            break
+
+    return selected
@@ -0,0 +1,444 @@
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import re
+import sqlite3
+
+import searchIndex
+
+# File paths
+store_file = 'authors_papers.db'
+legacy_json_file = 'authors_papers.json'
+
+# In-memory OAID index per store file, filled on first use
+_oaid_indexes = {}
+
+oaid_prefix = 'https://openalex.org/'
+oaid_pattern = re.compile(r'^(https://openalex\.org/)?(A\d+)$', re.IGNORECASE)
+
+def store_path_for(json_file):
+    """
+    Return the SQLite store that sits next to a legacy authors_papers JSON file.
+    """
+    return os.path.splitext(json_file)[0] + '.db'
+
+def normalize_oaid(oaid):
+    """
+    Normalise an OpenAlex author ID so it can be used as a store key.
+
+    IDs are matched case-insensitively, with or without the URL prefix, and
+    stored as 'https://openalex.org/A...'. Other keys are only stripped.
+    """
+    if not isinstance(oaid, str) or not oaid.strip():
+        raise ValueError("OAID must be a non-empty string.")
+    oaid = oaid.strip()
+    match = oaid_pattern.match(oaid)
+    if match:
+        return oaid_prefix + match.group(2).upper()
+    return oaid
+
+def connect(db_file=store_file, legacy_json=None):
+    """
+    Open the paper store, creating the schema if needed.
+
+    Works are stored once in 'works', keyed by OpenAlex work ID; 'author_works'
+    links them to authors and carries the per-author fields. Stores that still
+    keep a JSON paper list per author are split into these tables on open.
+
+    Args:
+        db_file (str): Path to the SQLite store.
+        legacy_json (str): Optional authors_papers JSON file. If the store is empty
+            and this file exists, it is migrated into the store once.
+
+    Returns:
+        sqlite3.Connection: An open connection to the store.
+    """
+    conn = sqlite3.connect(db_file)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS authors (
+            oaid TEXT PRIMARY KEY,
+            name TEXT,
+            last_synced TEXT,
+            metrics_stale INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE TABLE IF NOT EXISTS works (
+            id TEXT PRIMARY KEY,
+            doi TEXT,
+            topic_id TEXT,
+            publication_year INTEGER,
+            cited_by_count INTEGER,
+            title TEXT,
+            abstract TEXT,
+            citations_per_year REAL
+        );
+        CREATE TABLE IF NOT EXISTS author_works (
+            oaid TEXT NOT NULL,
+            work_id TEXT NOT NULL,
+            is_corresponding_author INTEGER,
+            PRIMARY KEY (oaid, work_id)
+        );
+        CREATE INDEX IF NOT EXISTS author_works_work ON author_works (work_id);
+        """
+    )
+    # Stores created before sync watermarks were tracked lack the column
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(authors)")}
+    if 'last_synced' not in columns:
+        conn.execute("ALTER TABLE authors ADD COLUMN last_synced TEXT")
+    # ...and the flag marking authors whose metrics need recomputing
+    if 'metrics_stale' not in columns:
+        conn.execute("ALTER TABLE authors ADD COLUMN metrics_stale INTEGER NOT NULL DEFAULT 1")
+    # Stores created before works were normalised keep a JSON paper list per author
+    if 'papers' in columns:
+        _split_papers_column(conn)
+    conn.commit()
+
+    if legacy_json and os.path.exists(legacy_json) and os.path.getsize(legacy_json) > 0:
+        has_authors = conn.execute("SELECT 1 FROM authors LIMIT 1").fetchone()
+        if not has_authors:
+            _import_json(conn, legacy_json)
+
+    return conn
+
+def _split_papers_column(conn):
+    # Move each author's embedded paper list into works and author_works, then drop the column
+    authors = conn.execute("SELECT oaid, papers FROM authors").fetchall()
+    for row in authors:
+        _write_papers(conn, row['oaid'], json.loads(row['papers'] or '[]'))
+    conn.execute("ALTER TABLE authors DROP COLUMN papers")
+    works = conn.execute("SELECT COUNT(*) FROM works").fetchone()[0]
+    links = conn.execute("SELECT COUNT(*) FROM author_works").fetchone()[0]
+    print(f"Normalised the papers of {len(authors)} authors into {works} works and {links} author-work links.")
+
+def open_for_json(json_file):
+    """
+    Open the store that replaces the given authors_papers JSON file.
+    """
+    return connect(store_path_for(json_file), legacy_json=json_file)
+
+def utc_now():
+    """
+    Return the current UTC time as an ISO 8601 string, used for sync watermarks.
+    """
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def store_file_of(conn):
+    """
+    Return the path of the store file behind a connection.
+    """
+    return conn.execute("PRAGMA database_list").fetchone()['file']
+
+def oaid_index(conn):
+    """
+    Return the in-memory set of OAIDs held by the store behind this connection.
+
+    The set is loaded once per store file and kept up to date by upsert_author.
+    """
+    db_file = store_file_of(conn)
+    if db_file not in _oaid_indexes:
+        _oaid_indexes[db_file] = set(list_oaids(conn))
+    return _oaid_indexes[db_file]
+
+def author_exists(conn, oaid):
+    """
+    Check whether an author is present in the store.
+
+    Answers from the in-memory OAID index, falling back to the store on a miss
+    in case another process added the author.
+    """
+    oaid = normalize_oaid(oaid)
+    index = oaid_index(conn)
+    if oaid in index:
+        return True
+
+    row = conn.execute("SELECT 1 FROM authors WHERE oaid = ?", (oaid,)).fetchone()
+    if row is not None:
+        index.add(oaid)
+    return row is not None
+
+# Work fields stored once per work; is_corresponding_author is stored per author
+work_columns = ['id', 'doi', 'topic_id', 'publication_year', 'cited_by_count', 'title', 'abstract', 'citations_per_year']
+
+def _work_from_row(row):
+    return {column: row[column] for column in work_columns}
+
+def _paper_from_row(row):
+    paper = _work_from_row(row)
+    paper['is_corresponding_author'] = bool(row['is_corresponding_author'])
+    return paper
+
+def _papers_for(conn, oaid):
+    rows = conn.execute(
+        """
+        SELECT works.*, author_works.is_corresponding_author
+        FROM author_works JOIN works ON works.id = author_works.work_id
+        WHERE author_works.oaid = ?
+        ORDER BY author_works.rowid
+        """,
+        (oaid,)
+    )
+    return [_paper_from_row(row) for row in rows]
+
+def get_author(conn, oaid):
+    """
+    Look up a single author by OAID.
+
+    Returns:
+        dict: {'oaid', 'name', 'papers', 'last_synced'} or None if the author is not stored.
+    """
+    oaid = normalize_oaid(oaid)
+    row = conn.execute("SELECT oaid, name, last_synced FROM authors WHERE oaid = ?", (oaid,)).fetchone()
+    if row is None:
+        return None
+    return {'oaid': row['oaid'], 'name': row['name'], 'papers': _papers_for(conn, oaid), 'last_synced': row['last_synced']}
+
+def get_works(conn, work_ids):
+    """
+    Look up stored works by OpenAlex work ID.
+
+    Returns:
+        dict: Work ID to its record (without per-author fields) for the works held.
+    """
+    work_ids = list(work_ids)
+    works = {}
+    for start in range(0, len(work_ids), 500):
+        chunk = work_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(f"SELECT * FROM works WHERE id IN ({placeholders})", chunk):
+            works[row['id']] = _work_from_row(row)
+    return works
+
+def _index_papers(conn, oaid, papers):
+    # Index the stored versions of the works, which keep fields a record left out,
+    # in the index next to this store; called after commit so no lock is held
+    works = get_works(conn, [paper['id'] for paper in papers])
+    searchIndex.index_papers(oaid, list(works.values()), searchIndex.index_path_for(store_file_of(conn)))
+
+def _unique_papers(papers):
+    # One record per work ID, the last one given winning, in first-seen order
+    return list({paper['id']: paper for paper in papers}.values())
+
+def _write_papers(conn, oaid, papers, replace=False):
+    # Upsert the works, keeping stored values for fields a record leaves out
+    assignments = ", ".join(f"{column} = COALESCE(excluded.{column}, works.{column})" for column in work_columns[1:])
+    conn.executemany(
+        f"""
+        INSERT INTO works ({', '.join(work_columns)}) VALUES ({', '.join('?' * len(work_columns))})
+        ON CONFLICT(id) DO UPDATE SET {assignments}
+        """,
+        [tuple(paper.get(column) for column in work_columns) for paper in papers]
+    )
+    conn.executemany(
+        """
+        INSERT INTO author_works (oaid, work_id, is_corresponding_author) VALUES (?, ?, ?)
+        ON CONFLICT(oaid, work_id) DO UPDATE SET
+            is_corresponding_author = COALESCE(excluded.is_corresponding_author, author_works.is_corresponding_author)
+        """,
+        [
+            (oaid, paper['id'], None if paper.get('is_corresponding_author') is None else int(paper['is_corresponding_author']))
+            for paper in papers
+        ]
+    )
+    work_ids = json.dumps([paper['id'] for paper in papers])
+    removed = []
+    if replace:
+        removed = [row['work_id'] for row in conn.execute(
+            "DELETE FROM author_works WHERE oaid = ? AND work_id NOT IN (SELECT value FROM json_each(?)) RETURNING work_id",
+            (oaid, work_ids)
+        )]
+        # Works no author links any more are dropped with their abstracts
+        conn.execute(
+            """
+            DELETE FROM works
+            WHERE id IN (SELECT value FROM json_each(?))
+              AND id NOT IN (SELECT work_id FROM author_works)
+            """,
+            (json.dumps(removed),)
+        )
+
+    # The author's metrics, and those of co-authors sharing an updated work, need recomputing
+    conn.execute(
+        """
+        UPDATE authors SET metrics_stale = 1
+        WHERE oaid = ? OR oaid IN (
+            SELECT oaid FROM author_works WHERE work_id IN (SELECT value FROM json_each(?))
+        )
+        """,
+        (oaid, work_ids)
+    )
+    return removed
+
+def upsert_author(conn, oaid, name, papers, synced_at=None):
+    """
+    Insert an author or replace their stored papers.
+
+    Works already held (e.g. through a co-author) are updated rather than duplicated.
+
+    Args:
+        synced_at (str): Optional sync watermark to record alongside the papers.
+    """
+    oaid = normalize_oaid(oaid)
+    papers = _unique_papers(papers)
+    _write_author(conn, oaid, name, synced_at)
+    removed = _write_papers(conn, oaid, papers, replace=True)
+    conn.commit()
+    oaid_index(conn).add(oaid)
+
+    # Keep the full-text index in step; only new or changed works are indexed
+    _index_papers(conn, oaid, papers)
+    searchIndex.unlink_papers(oaid, removed, searchIndex.index_path_for(store_file_of(conn)))
+
+def _write_author(conn, oaid, name, synced_at=None):
+    conn.execute(
+        """
+        INSERT INTO authors (oaid, name, last_synced) VALUES (?, ?, ?)
+        ON CONFLICT(oaid) DO UPDATE SET
+            name = COALESCE(excluded.name, authors.name),
+            last_synced = COALESCE(excluded.last_synced, authors.last_synced)
+        """,
+        (oaid, name, synced_at)
+    )
+
+def _linked_work_ids(conn, oaid):
+    return {row['work_id'] for row in conn.execute("SELECT work_id FROM author_works WHERE oaid = ?", (oaid,))}
+
+def append_papers(conn, oaid, papers, name=None):
+    """
+    Append papers to an author's list, skipping papers already stored by ID.
+
+    Returns:
+        int: The number of papers that were added.
+    """
+    oaid = normalize_oaid(oaid)
+    known_ids = _linked_work_ids(conn, oaid)
+    new_papers = [paper for paper in _unique_papers(papers) if paper['id'] not in known_ids]
+    _write_author(conn, oaid, name)
+    _write_papers(conn, oaid, new_papers)
+    conn.commit()
+    oaid_index(conn).add(oaid)
+    _index_papers(conn, oaid, new_papers)
+    return len(new_papers)
+
+def merge_papers(conn, oaid, papers, name=None, synced_at=None):
+    """
+    Merge freshly fetched papers into an author's stored list.
+
+    Papers already stored are updated in place (e.g. cited_by_count and
+    citations_per_year); new papers are appended.
+
+    Returns:
+        tuple: The number of papers added and the number updated.
+    """
+    oaid = normalize_oaid(oaid)
+    papers = _unique_papers(papers)
+    known_ids = _linked_work_ids(conn, oaid)
+    updated = sum(1 for paper in papers if paper['id'] in known_ids)
+
+    _write_author(conn, oaid, name, synced_at)
+    _write_papers(conn, oaid, papers)
+    conn.commit()
+    oaid_index(conn).add(oaid)
+    _index_papers(conn, oaid, papers)
+    return len(papers) - updated, updated
+
+def list_oaids(conn):
+    """
+    Return the OAIDs of all stored authors.
+    """
+    return [row['oaid'] for row in conn.execute("SELECT oaid FROM authors")]
+
+def iter_authors(conn):
+    """
+    Yield stored authors one at a time.
+
+    Authors and their papers are read in a single ordered join, so only one
+    author's papers are held in memory at a time.
+    """
+    rows = conn.execute(
+        """
+        SELECT authors.oaid AS author_oaid, authors.name AS author_name, authors.last_synced,
+               works.*, author_works.is_corresponding_author
+        FROM authors
+        LEFT JOIN author_works ON author_works.oaid = authors.oaid
+        LEFT JOIN works ON works.id = author_works.work_id
+        ORDER BY authors.oaid, author_works.rowid
+        """
+    )
+    author = None
+    for row in rows:
+        if author is None or author['oaid'] != row['author_oaid']:
+            if author is not None:
+                yield author
+            author = {'oaid': row['author_oaid'], 'name': row['author_name'], 'papers': [], 'last_synced': row['last_synced']}
+        if row['id'] is not None:
+            author['papers'].append(_paper_from_row(row))
+    if author is not None:
+        yield author
+
+def store_stats(conn):
+    """
+    Return the number of authors, distinct works and author-work links in the store.
+    """
+    return {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ('authors', 'works', 'author_works')
+    }
+
+def _import_json(conn, json_file):
+    with open(json_file, 'r', encoding='utf-8') as f:
+        try:
+            authors_data = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error reading JSON file at {json_file}. Nothing to migrate.")
+            return 0
+
+    migrated = {}
+    for author in authors_data:
+        if not author.get('oaid'):
+            continue
+        oaid = normalize_oaid(author['oaid'])
+        if conn.execute("SELECT 1 FROM authors WHERE oaid = ?", (oaid,)).fetchone():
+            continue
+        papers = author.get('papers', [])
+        _write_author(conn, oaid, author.get('name'))
+        _write_papers(conn, oaid, papers)
+        migrated[oaid] = papers
+    conn.commit()
+
+    # Migrated works are searchable straight away, and their authors have metrics, as with any other write
+    for oaid, papers in migrated.items():
+        _index_papers(conn, oaid, papers)
+    if migrated:
+        # Imported here to avoid circular imports: metrics reads the paper store
+        import metrics
+        metrics.update_metrics(conn)
+    print(f"Migrated {len(migrated)} of {len(authors_data)} authors from {json_file}.")
+    return len(migrated)
+
+def migrate_from_json(json_file=legacy_json_file, db_file=None):
+    """
+    One-shot migration of an authors_papers JSON file into the paper store.
+
+    Authors already present in the store are left untouched.
+
+    Returns:
+        int: The number of authors migrated.
+    """
+    db_file = db_file or store_path_for(json_file)
+    conn = connect(db_file)
+    try:
+        return _import_json(conn, json_file)
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Migrate authors_papers.json into the paper store.")
+    parser.add_argument('json_file', nargs='?', default=legacy_json_file)
+    parser.add_argument('--db', default=None, help="Path to the SQLite store (defaults to next to the JSON file).")
+    args = parser.parse_args()
+    migrate_from_json(args.json_file, args.db)
+    conn = connect(args.db or store_path_for(args.json_file))
+    print(store_stats(conn))
+    conn.close()
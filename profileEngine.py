@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import openai
+from openai import AsyncOpenAI
+
+import llmCache
+import paperCorpus
+import paperStore
+import profileStore
+from paperSelection import count_tokens
+from profileWriter import (
+    build_profile_prompt, build_regenerate_prompt, completion_key, max_tokens, model,
+    parse_challenges, pre_prompt, select_titles_and_abstracts, temperature,
+)
+
+# File paths
+json_file = 'authors_papers.json'
+output_csv = 'authors_profiles.csv'
+
+# Errors worth retrying: rate limits, server errors, timeouts and dropped connections
+retryable_errors = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    asyncio.TimeoutError,
+)
+
+class TokenBucket:
+    """
+    Asynchronous token bucket refilled continuously at a fixed rate.
+
+    Shared by all requests of an engine so that together they stay within the
+    requests-per-minute and tokens-per-minute limits of the API.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+class ProfileEngine:
+    """
+    Generates profiles concurrently against an OpenAI-compatible API.
+
+    Args:
+        client (AsyncOpenAI): Optional client; by default one is built from
+            OPENAI_API_KEY and base_url (or OPENAI_BASE_URL), e.g. a local fake server.
+        requests_per_minute (int): Request rate shared by all calls.
+        tokens_per_minute (int): Token rate shared by all calls (prompt plus max_tokens).
+        max_concurrency (int): Maximum number of requests in flight.
+        max_retries (int): Retries for rate limits, 5xx errors and timeouts.
+        timeout (float): Per-request timeout in seconds.
+        use_cache (bool): Set to False to bypass the LLM cache.
+    """
+
+    def __init__(self, client=None, base_url=None, requests_per_minute=500, tokens_per_minute=30000,
+                 max_concurrency=8, max_retries=5, timeout=60.0, use_cache=True):
+        self.client = client or AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"), base_url=base_url, max_retries=0
+        )
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.use_cache = use_cache
+
+    async def complete(self, prompt):
+        """
+        Send one chat completion with rate limiting, timeout and jittered retries.
+
+        Cached completions are returned without touching the rate limiters.
+
+        Returns:
+            str: The stripped completion text.
+        """
+        key = completion_key(prompt)
+        if self.use_cache:
+            cached = llmCache.completion_cache.get(key)
+            if cached is not None:
+                return cached
+
+        cost = count_tokens(pre_prompt) + count_tokens(prompt) + max_tokens
+        for attempt in range(self.max_retries + 1):
+            await self.request_bucket.acquire()
+            await self.token_bucket.acquire(cost)
+            try:
+                async with self.semaphore:
+                    response = await asyncio.wait_for(
+                        self.client.chat.completions.create(
+                            model=model,
+                            messages=[
+                                {"role": "system", "content": pre_prompt},
+                                {"role": "user", "content": prompt}
+                            ],
+                            max_tokens=max_tokens,
+                            temperature=temperature
+                        ),
+                        timeout=self.timeout,
+                    )
+                content = response.choices[0].message.content.strip()
+                llmCache.completion_cache.put(key, model, content)
+                return content
+            except retryable_errors as e:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+
+    def _backoff(self, attempt, error):
+        # Honour Retry-After when the server sends it, otherwise exponential backoff
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = min(60.0, 2 ** attempt)
+        return delay * random.uniform(0.5, 1.5)
+
+    async def profile_from_papers(self, papers, author_name, ranked=False):
+        """
+        Async counterpart of profileWriter.profile_from_papers.
+        """
+        titles_and_abstracts = select_titles_and_abstracts(papers, ranked=ranked)
+        if not titles_and_abstracts.strip():
+            return f"No abstracts available to generate a detailed profile for {author_name}.", []
+        content = await self.complete(build_profile_prompt(titles_and_abstracts, author_name))
+        return content, parse_challenges(content)
+
+    async def regenerate_profile(self, existing_profile, user_input):
+        """
+        Async counterpart of profileWriter.regenerate_profile.
+        """
+        return await self.complete(build_regenerate_prompt(existing_profile, user_input))
+
+    async def profile_many(self, authors, on_result=None):
+        """
+        Generate profiles for many authors concurrently.
+
+        Args:
+            authors (list): Dicts with 'oaid', 'name' and 'papers', and 'ranked' set when
+                the papers come ranked from paperCorpus.ranked_papers.
+            on_result (callable): Optional callback(author, result, error) called as each finishes.
+
+        Returns:
+            list: (author, (profile_text, classification) or None, error or None) per author.
+        """
+        async def run(author):
+            try:
+                result = await self.profile_from_papers(author['papers'], author['name'], author.get('ranked', False))
+                error = None
+            except Exception as e:
+                result, error = None, e
+            if on_result:
+                on_result(author, result, error)
+            return author, result, error
+
+        return await asyncio.gather(*(run(author) for author in authors))
+
+def regenerate_all_profiles(csv_file=output_csv, json_file=json_file, **engine_options):
+    """
+    Regenerate profile_llm and classification for every author in the profile store.
+
+    Returns:
+        list: (name, error) for each author that failed.
+    """
+    profiles_df = profileStore.read_profiles(csv_file, columns=['oaid', 'name'])
+    # Papers are held as columns; each author's abstracts are read only when their profile is built
+    corpus = paperCorpus.load(json_file)
+    authors = []
+    for _, row in profiles_df.iterrows():
+        if not isinstance(row['oaid'], str):
+            continue
+        oaid = paperStore.normalize_oaid(row['oaid'])
+        if oaid not in corpus:
+            print(f"No papers stored for {row['name']} (OAID: {row['oaid']}), skipping.")
+            continue
+        authors.append({'oaid': row['oaid'], 'name': row['name'], 'papers': corpus.ranked_papers(oaid), 'ranked': True})
+
+    start_time = time.time()
+    finished = []
+
+    def report(author, result, error):
+        finished.append(author)
+        status = 'failed' if error else 'done'
+        print(f"[{len(finished)}/{len(authors)}] {author['name']}: {status} ({time.time() - start_time:.0f}s)")
+
+    engine = ProfileEngine(**engine_options)
+    try:
+        results = asyncio.run(engine.profile_many(authors, on_result=report))
+    finally:
+        corpus.close()
+
+    failed, changes = [], {}
+    for author, result, error in results:
+        if error is not None:
+            failed.append((author['name'], str(error)))
+            continue
+        profile_text, classification = result
+        changes[author['oaid']] = {'profile_llm': profile_text, 'classification': json.dumps(classification)}
+
+    profileStore.update_profiles(changes, csv_file)
+    print(f"Regenerated {len(results) - len(failed)} profiles, {len(failed)} failed.")
+    for name, error in failed:
+        print(f"  {name}: {error}")
+    return failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Regenerate all profiles concurrently.")
+    parser.add_argument('--csv', default=output_csv)
+    parser.add_argument('--json', default=json_file)
+    parser.add_argument('--base-url', default=None, help="OpenAI-compatible endpoint, e.g. a local fake server.")
+    parser.add_argument('--rpm', type=int, default=500, help="Requests per minute.")
+    parser.add_argument('--tpm', type=int, default=30000, help="Tokens per minute.")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the LLM response cache.")
+    args = parser.parse_args()
+
+    regenerate_all_profiles(
+        args.csv, args.json, base_url=args.base_url, requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm, max_concurrency=args.concurrency,
+        max_retries=args.retries, timeout=args.timeout, use_cache=not args.no_cache,
+    )
@@ -0,0 +1,423 @@
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import os
+import sqlite3
+
+import pandas as pd
+
+import paperStore
+import searchIndex
+
+# File paths
+csv_file = 'authors_profiles.csv'  # legacy CSV, migrated on first use and kept as the export format
+
+profile_columns = ["name", "oaid", "institution", "email", "profile_llm", "human_input", "profile_llm_human", "classification", "input"]
+
+# Long free-text columns, left out of table views unless asked for
+text_columns = ["profile_llm", "human_input", "profile_llm_human"]
+
+# Columns whose changes are pushed to the full-text index
+indexed_columns = {"name", "profile_llm", "profile_llm_human"}
+
+def store_path_for(csv_file):
+    """
+    Return the SQLite store that sits next to a legacy authors_profiles CSV file.
+    """
+    return os.path.splitext(csv_file)[0] + '.db'
+
+def connect(db_file, legacy_csv=None):
+    """
+    Open the profile store, creating the table if needed.
+
+    The connection is in autocommit mode; writes go through transaction(). The
+    schema is created once, by the first connection to a new store; later opens
+    only read. If the store is empty and a legacy CSV file exists, it is imported first.
+    """
+    conn = sqlite3.connect(db_file, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'store_meta'").fetchone() is None:
+        _create_schema(conn)
+
+    if legacy_csv and os.path.exists(legacy_csv):
+        if conn.execute("SELECT 1 FROM profiles LIMIT 1").fetchone() is None:
+            # Checked again under the write lock, as another process may be importing too
+            imported = import_csv(conn, legacy_csv, only_if_empty=True)
+            if imported:
+                print(f"Migrated {imported} profiles from {legacy_csv} to {db_file}.")
+    return conn
+
+def _create_schema(conn):
+    # WAL lets readers carry on while a writer holds the lock; the mode is kept in the file
+    conn.execute("PRAGMA journal_mode=WAL")
+    try:
+        conn.executescript(
+            f"""
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS profiles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {", ".join(f"{column} TEXT" + (" UNIQUE" if column == "oaid" else "") for column in profile_columns)},
+                updated TEXT
+            );
+            CREATE INDEX IF NOT EXISTS profiles_name ON profiles (lower(trim(name)));
+            CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', 0);
+            COMMIT;
+            """
+        )
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+def open_for_csv(csv_file=csv_file):
+    """
+    Open the store for a legacy CSV path, migrating the CSV on first use.
+    """
+    return connect(store_path_for(csv_file), legacy_csv=csv_file)
+
+@contextmanager
+def transaction(csv_file=csv_file):
+    """
+    Run a write transaction on the store.
+
+    BEGIN IMMEDIATE takes the write lock up front, so concurrent sessions and
+    processes queue behind each other instead of overwriting each other's rows.
+    The store version is bumped on commit so readers can invalidate caches.
+    """
+    conn = open_for_csv(csv_file)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'version'")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+def _value(value):
+    # Missing values from pandas are stored as NULL
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return None
+    return str(value)
+
+def _key(oaid):
+    # Rows are keyed by the canonical OAID, as in the paper store; a missing ID stays NULL
+    oaid = _value(oaid)
+    return paperStore.normalize_oaid(oaid) if oaid and oaid.strip() else None
+
+def _check_columns(columns):
+    unknown = set(columns) - set(profile_columns)
+    if unknown:
+        raise ValueError(f"Unknown profile columns: {', '.join(sorted(unknown))}.")
+
+def _upsert(conn, oaid, fields):
+    oaid = _key(oaid)
+    fields = {column: _value(value) for column, value in fields.items() if column != 'oaid'}
+    _check_columns(fields)
+    now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    if oaid is None:
+        # Authors not (yet) found on OpenAlex are kept by name only
+        columns = list(fields) + ['updated']
+        conn.execute(
+            f"INSERT INTO profiles ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            (*fields.values(), now)
+        )
+        return
+
+    columns = ['oaid'] + list(fields) + ['updated']
+    assignments = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+    conn.execute(
+        f"""
+        INSERT INTO profiles ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT(oaid) DO UPDATE SET {assignments}
+        """,
+        (oaid, *fields.values(), now)
+    )
+
+def _index_rows(conn, oaids):
+    # Push the given profiles to the full-text index next to the store; call once the write lock is released
+    oaids = list(oaids)
+    rows = []
+    for start in range(0, len(oaids), 500):
+        chunk = oaids[start:start + 500]
+        rows += conn.execute(
+            f"SELECT oaid, name, profile_llm, profile_llm_human FROM profiles WHERE oaid IN ({','.join('?' * len(chunk))})",
+            chunk
+        ).fetchall()
+    searchIndex.index_profiles([dict(row) for row in rows], searchIndex.index_path_for(paperStore.store_file_of(conn)))
+
+def _reindex(oaids, csv_file):
+    # Push the changed profiles to the full-text index next to the store, once the write lock is released
+    if not oaids:
+        return
+    conn = open_for_csv(csv_file)
+    try:
+        _index_rows(conn, oaids)
+    finally:
+        conn.close()
+
+def upsert_profile(oaid, fields, csv_file=csv_file):
+    """
+    Insert an author's row or update the given fields of it.
+
+    Args:
+        oaid (str): The OpenAlex ID keying the row; None adds a row known by name only.
+        fields (dict): Column values to set; other columns are left unchanged.
+    """
+    upsert_profiles([dict(fields, oaid=oaid)], csv_file)
+
+def upsert_profiles(rows, csv_file=csv_file):
+    """
+    Insert or update several rows, keyed by 'oaid', in one transaction.
+
+    Returns:
+        int: The number of rows written.
+    """
+    with transaction(csv_file) as conn:
+        for row in rows:
+            _upsert(conn, row.get('oaid'), row)
+    _reindex([
+        _key(row.get('oaid')) for row in rows
+        if _key(row.get('oaid')) and indexed_columns & set(row)
+    ], csv_file)
+    return len(rows)
+
+def add_profile_if_missing(oaid, name, csv_file=csv_file):
+    """
+    Add a row for an author unless one with the same name or OpenAlex ID is stored.
+
+    The check and the insert run in one transaction, so concurrent sessions
+    looking up the same author add a single row.
+
+    Args:
+        oaid (str): The author's OpenAlex ID; None adds a row known by name only.
+        name (str): The author's name.
+
+    Returns:
+        bool: Whether a row was added.
+    """
+    oaid = _key(oaid)
+    with transaction(csv_file) as conn:
+        existing = conn.execute(
+            "SELECT 1 FROM profiles WHERE lower(trim(name)) = ? OR oaid = ? LIMIT 1",
+            (name.strip().lower(), oaid)
+        ).fetchone()
+        if existing is None:
+            _upsert(conn, oaid, {'name': name.strip()})
+    if existing is None:
+        _reindex([oaid] if oaid else [], csv_file)
+    return existing is None
+
+def update_profiles(changes, csv_file=csv_file, key='oaid'):
+    """
+    Apply keyed field updates to existing rows in one transaction.
+
+    Args:
+        changes (dict): {oaid: {column: value}} for the rows to change.
+        key (str): 'oaid', or 'id' when changes are keyed by the row's primary
+            key, which also reaches rows stored without an OAID.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    if key not in ('oaid', 'id'):
+        raise ValueError(f"Rows are keyed by 'oaid' or 'id', not {key!r}.")
+    if not changes:
+        return 0
+    if key == 'oaid':
+        changes = {_key(oaid): fields for oaid, fields in changes.items()}
+    updated = 0
+    reindexed = []
+    with transaction(csv_file) as conn:
+        for row_key, fields in changes.items():
+            _check_columns(fields)
+            assignments = ", ".join(f"{column} = ?" for column in fields)
+            rows = conn.execute(
+                f"UPDATE profiles SET {assignments}, updated = ? WHERE {key} = ? RETURNING oaid",
+                (*(_value(value) for value in fields.values()),
+                 datetime.now(timezone.utc).isoformat(timespec='seconds'), row_key)
+            ).fetchall()
+            updated += len(rows)
+            if indexed_columns & set(fields):
+                reindexed += [row['oaid'] for row in rows if row['oaid']]
+    _reindex(reindexed, csv_file)
+    return updated
+
+def get_profile(oaid, csv_file=csv_file):
+    """
+    Return an author's row as a dict, or None.
+    """
+    oaid = _key(oaid)
+    if oaid is None:
+        return None
+    conn = open_for_csv(csv_file)
+    try:
+        row = conn.execute("SELECT * FROM profiles WHERE oaid = ?", (oaid,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def find_by_name(name, csv_file=csv_file):
+    """
+    Return the first row whose name matches, ignoring case and surrounding spaces, or None.
+    """
+    conn = open_for_csv(csv_file)
+    try:
+        row = conn.execute(
+            "SELECT * FROM profiles WHERE lower(trim(name)) = ? ORDER BY id LIMIT 1",
+            (name.strip().lower(),)
+        ).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def latest_profile(csv_file=csv_file):
+    """
+    Return the most recently added row as a dict, or None if the store is empty.
+    """
+    conn = open_for_csv(csv_file)
+    try:
+        row = conn.execute("SELECT * FROM profiles ORDER BY id DESC LIMIT 1").fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def store_version(csv_file=csv_file):
+    """
+    Return a counter that changes whenever the store is written, for cache keys.
+    """
+    conn = open_for_csv(csv_file)
+    try:
+        return conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0]
+    finally:
+        conn.close()
+
+def read_profiles(csv_file=csv_file, columns=None):
+    """
+    Read the profiles table, optionally only some of its columns, in insertion order.
+    """
+    columns = list(columns or profile_columns)
+    _check_columns(columns)
+    conn = open_for_csv(csv_file)
+    try:
+        rows = conn.execute(f"SELECT {', '.join(columns)} FROM profiles ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    return pd.DataFrame([tuple(row) for row in rows], columns=columns, dtype=object)
+
+def query_profiles(columns=None, search=None, sort_by=None, ascending=True, offset=0, limit=50, csv_file=csv_file):
+    """
+    Return one page of the profiles table.
+
+    Projection, filtering, sorting and paging run in SQL, so only the rows and
+    columns of the page are read.
+
+    Args:
+        columns (list): Columns to return; 'id', the row key, and 'oaid' are always included.
+        search (str): Optional case-insensitive substring matched against name, institution and email.
+        sort_by (str): Optional column to sort by.
+        offset (int): Index of the first row of the page.
+        limit (int): Maximum number of rows in the page.
+
+    Returns:
+        tuple: (page DataFrame, total number of matching rows).
+    """
+    columns = list(columns or [column for column in profile_columns if column not in text_columns])
+    if 'oaid' not in columns:
+        columns.insert(0, 'oaid')
+    _check_columns(columns)
+    columns.insert(0, 'id')
+
+    where, params = "", []
+    if search and search.strip():
+        where = "WHERE " + " OR ".join(f"instr(lower({column}), ?) > 0" for column in ('name', 'institution', 'email'))
+        params = [search.strip().lower()] * 3
+    order = "id"
+    if sort_by in profile_columns:
+        # NULLs last in either direction, then insertion order for ties
+        order = f"{sort_by} IS NULL, {sort_by} {'ASC' if ascending else 'DESC'}, id"
+
+    conn = open_for_csv(csv_file)
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM profiles {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {', '.join(columns)} FROM profiles {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        ).fetchall()
+    finally:
+        conn.close()
+    return pd.DataFrame([tuple(row) for row in rows], columns=columns, dtype=object), total
+
+def changed_fields(original, edited):
+    """
+    Compare two versions of a page keyed by 'id' and return the edited cells.
+
+    The 'id' and 'oaid' columns are keys and never reported as changed.
+
+    Returns:
+        dict: {id: {column: new value}} for every changed cell, for update_profiles(key='id').
+    """
+    changes = {}
+    for (_, before), (_, after) in zip(original.iterrows(), edited.iterrows()):
+        for column in edited.columns:
+            if column in ('id', 'oaid'):
+                continue
+            old, new = before[column], after[column]
+            if (pd.isna(old) and pd.isna(new)) or old == new:
+                continue
+            changes.setdefault(int(before['id']), {})[column] = None if pd.isna(new) else new
+    return changes
+
+def import_csv(conn, csv_file, only_if_empty=False):
+    """
+    Import the rows of a profiles CSV into the store and the full-text index; rows are keyed by 'oaid'.
+
+    Args:
+        only_if_empty (bool): Import nothing unless the store is empty once the write lock is held.
+
+    Returns:
+        int: The number of rows imported.
+    """
+    profiles_df = pd.read_csv(csv_file, dtype=object)
+    rows = profiles_df.reindex(columns=profile_columns).to_dict('records')
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if only_if_empty and conn.execute("SELECT 1 FROM profiles LIMIT 1").fetchone() is not None:
+            conn.execute("ROLLBACK")
+            return 0
+        for row in rows:
+            _upsert(conn, row.get('oaid'), row)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    _index_rows(conn, {_key(row.get('oaid')) for row in rows} - {None})
+    return len(rows)
+
+def export_csv(output_csv, csv_file=csv_file):
+    """
+    Write the whole profiles table to a CSV file in the legacy column layout.
+
+    Returns:
+        int: The number of rows exported.
+    """
+    profiles_df = read_profiles(csv_file)
+    profiles_df.to_csv(output_csv + '.tmp', index=False)
+    os.replace(output_csv + '.tmp', output_csv)
+    return len(profiles_df)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Migrate or export the author profile store.")
+    parser.add_argument('--csv', default=csv_file, help="Legacy CSV the store sits next to.")
+    parser.add_argument('--export', metavar='PATH', help="Export the store to a CSV file.")
+    args = parser.parse_args()
+
+    conn = open_for_csv(args.csv)
+    print(f"{store_path_for(args.csv)}: {conn.execute('SELECT COUNT(*) FROM profiles').fetchone()[0]} profiles.")
+    conn.close()
+    if args.export:
+        print(f"Exported {export_csv(args.export, args.csv)} profiles to {args.export}.")
@@ -1,8 +1,12 @@
 import os
 import json
-import pandas as pd
 import time
 from openai import OpenAI
+import llmCache
+import paperCorpus
+import paperSelection
+import paperStore
+import profileStore
 
 # Load OpenAI API key from environment variables
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -11,6 +15,11 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 json_file = 'authors_papers.json'
 output_csv = 'authors_profiles.csv'
 
+# Model settings for OpenAI
+model = "gpt-4o"
+max_tokens = 500
+temperature = 0.5
+
 # Pre-prompt for OpenAI
 pre_prompt = '''
 You are writing a scientific outreach profile for researchers and scientists. This needs to be engaging and not too specific.
@@ -18,11 +27,11 @@ Classify the researcher within 2 or 3 climate tech challenge spaces (defined by
 Only provide truthful insights based on the provided information. Use British English.
 '''
 
-def query_openai_profile(titles_and_abstracts, author_name):
+def build_profile_prompt(titles_and_abstracts, author_name):
     """
-    Query OpenAI API to generate a profile for a researcher.
+    Build the user prompt asking for a researcher's profile.
     """
-    prompt = f"""
+    return f"""
     The researcher's name is {author_name}.
     Here are selected titles and abstracts for this researcher:
     {titles_and_abstracts}
@@ -34,121 +43,204 @@ def query_openai_profile(titles_and_abstracts, author_name):
     And classify their work within 2 or 3 best-fit climate tech challenge spaces specified by you, 
     in this format: Relevant climate challenges: X, Y, Z
     """
+
+def parse_challenges(content):
+    """
+    Extract the climate challenges listed after 'Relevant climate challenges: '.
+    """
+    challenges_start = content.find("Relevant climate challenges: ")
+    if challenges_start != -1:
+        challenges_text = content[challenges_start + len("Relevant climate challenges: "):].strip()
+        return [challenge.strip() for challenge in challenges_text.split(",")]
+    return []
+
+def completion_key(prompt):
+    """
+    Content address of a completion request for the LLM cache.
+    """
+    return llmCache.cache_key(model, pre_prompt, prompt, {'max_tokens': max_tokens, 'temperature': temperature})
+
+def stream_chat_completion(prompt, use_cache=True):
+    """
+    Stream a chat completion as text chunks, caching the full text once the stream ends.
+
+    A cached completion is yielded as a single chunk.
+    """
+    key = completion_key(prompt)
+    if use_cache:
+        cached = llmCache.completion_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": pre_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True
+    )
+    chunks = []
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            chunks.append(delta)
+            yield delta
+    llmCache.completion_cache.put(key, model, "".join(chunks).strip())
+
+def chat_completion(prompt, use_cache=True, stream_handler=None):
+    """
+    Send a chat completion, answering from the LLM cache when the same request was made before.
+
+    Args:
+        prompt (str): The rendered user prompt.
+        use_cache (bool): Set to False to bypass the cache and always call the API.
+        stream_handler (callable): Optional consumer of the streamed text chunks that
+            returns the full text, e.g. st.write_stream to render the completion as it arrives.
+
+    Returns:
+        str: The stripped completion text.
+    """
+    if stream_handler is not None:
+        return str(stream_handler(stream_chat_completion(prompt, use_cache=use_cache))).strip()
+
+    key = completion_key(prompt)
+    if use_cache:
+        cached = llmCache.completion_cache.get(key)
+        if cached is not None:
+            return cached
+
     response = client.chat.completions.create(
-        model="gpt-4o",
+        model=model,
         messages=[
             {"role": "system", "content": pre_prompt},
             {"role": "user", "content": prompt}
         ],
-        max_tokens=500,
-        temperature=0.5
+        max_tokens=max_tokens,
+        temperature=temperature
     )
     content = response.choices[0].message.content.strip()
+    llmCache.completion_cache.put(key, model, content)
+    return content
+
+def query_openai_profile(titles_and_abstracts, author_name, use_cache=True, stream_handler=None):
+    """
+    Query OpenAI API to generate a profile for a researcher.
+
+    Set use_cache to False to bypass the LLM cache. With a stream_handler the
+    completion is streamed through it and the challenges are parsed at the end.
+    """
+    prompt = build_profile_prompt(titles_and_abstracts, author_name)
+    content = chat_completion(prompt, use_cache=use_cache, stream_handler=stream_handler)
 
     # Extract classification challenges
-    challenges_start = content.find("Relevant climate challenges: ")
-    if challenges_start != -1:
-        challenges_text = content[challenges_start + len("Relevant climate challenges: "):].strip()
-        challenges = [challenge.strip() for challenge in challenges_text.split(",")]
-    else:
-        challenges = []
+    return content, parse_challenges(content)
 
-    return content, challenges
+def select_titles_and_abstracts(papers, token_budget=paperSelection.token_budget, ranked=False):
+    """
+    Render the papers used in the profile prompt as title/abstract pairs.
 
-def generate_profile_for_latest_entry(json_file, output_csv):
+    Papers are ranked (unless ranked is set) and packed into token_budget tokens by paperSelection.
     """
-    Generate a profile for the latest entry in the CSV file and match it with the JSON data.
+    selected_papers = paperSelection.select_papers(papers, token_budget=token_budget, ranked=ranked)
+    return "\n".join(
+        f"Title: {title}\nAbstract: {abstract}"
+        for title, abstract in selected_papers
+    )
+
+def profile_from_papers(papers, author_name, use_cache=True, stream_handler=None, ranked=False):
     """
-    # Load papers from the JSON file
-    with open(json_file, 'r', encoding='utf-8') as f:
-        authors_data = json.load(f)
+    Generate a profile and its climate challenges from an author's papers.
 
-    # Check if the JSON is empty
-    if not authors_data:
-        print("No authors found in the JSON file.")
-        return
+    Args:
+        papers (list): The author's paper records from the paper store.
+        author_name (str): The name used in the profile.
+        use_cache (bool): Set to False to bypass the LLM cache.
+        stream_handler (callable): Optional consumer of the streamed completion, see chat_completion.
+        ranked (bool): Set when papers come ranked from paperCorpus.ranked_papers.
 
-    # Load or initialize the output CSV
-    if os.path.exists(output_csv):
-        profiles_df = pd.read_csv(output_csv)
-    else:
-        profiles_df = pd.DataFrame(columns=['oaid', 'name', 'profile_llm', 'classification'])
+    Returns:
+        tuple: The profile text and the list of climate challenges.
+    """
+    titles_and_abstracts = select_titles_and_abstracts(papers, ranked=ranked)
 
-    # Get the latest entry in the CSV
-    if profiles_df.empty:
-        print("The profiles CSV is empty. No latest entry to process.")
-        return
+    # Generate the profile and challenges using OpenAI
+    if titles_and_abstracts.strip():
+        return query_openai_profile(
+            titles_and_abstracts, author_name, use_cache=use_cache, stream_handler=stream_handler
+        )
+    return f"No abstracts available to generate a detailed profile for {author_name}.", []
 
-    latest_entry = profiles_df.iloc[-1]  # Retrieve the last row
-    oaid_normalized = latest_entry['oaid'].lower().strip()
-    name_normalized = latest_entry['name'].lower().strip()
+def generate_profile_for_oaid(oaid, json_file=json_file, output_csv=output_csv, use_cache=True, stream_handler=None):
+    """
+    Generate and save the profile of one author from their stored papers.
 
-    # Match the latest entry with the JSON data
-    matched_author = next(
-        (author for author in authors_data
-         if author['oaid'].lower().strip() == oaid_normalized and
-         author['name'].lower().strip() == name_normalized),
-        None
-    )
+    Set use_cache to False to bypass the LLM cache. With a stream_handler the profile
+    is streamed through it; the profile is saved once the stream ends.
+
+    Args:
+        oaid (str): The author's OpenAlex ID.
+        json_file (str): Path to the legacy JSON file the paper store sits next to.
+        output_csv (str): Path to the legacy CSV file the profile store sits next to.
 
-    if not matched_author:
-        print(f"No matching author found in the JSON file for {latest_entry['name']} (OAID: {latest_entry['oaid']}).")
+    Returns:
+        tuple: The profile text and the list of climate challenges, or None if no profile was generated.
+    """
+    # Load the author's works as columns; abstracts are only read for the papers selected
+    oaid = paperStore.normalize_oaid(oaid)
+    corpus = paperCorpus.load(json_file, oaids=[oaid])
+    if oaid not in corpus:
+        print(f"No papers found in the paper store for OAID {oaid}.")
         return
 
-    # Extract matched author's data
-    papers = matched_author.get('papers', [])
-    selected_papers = papers[:10]  # Top 10 papers
-    titles_and_abstracts = "\n".join(
-        f"Title: {paper['title']}\nAbstract: {paper['abstract']}"
-        for paper in selected_papers if paper['abstract']
-    )
+    # Prefer the name in the profile store, which is the one the user entered
+    profile_row = profileStore.get_profile(oaid, output_csv)
+    author_name = (profile_row or {}).get('name') or corpus.author_name(oaid)
 
-    # Generate the profile and challenges using OpenAI
-    if titles_and_abstracts.strip():
-        profile_text, classification = query_openai_profile(titles_and_abstracts, latest_entry['name'])
-    else:
-        profile_text = f"No abstracts available to generate a detailed profile for {latest_entry['name']}."
-        classification = []
-
-    classification_str = json.dumps(classification)
-
-    # Check if the profile already exists
-    existing_profile_index = profiles_df[
-        (profiles_df['oaid'].str.lower().str.strip() == oaid_normalized) &
-        (profiles_df['name'].str.lower().str.strip() == name_normalized)
-    ].index
-
-    if not existing_profile_index.empty:
-        existing_profile_index = existing_profile_index[0]
-        profiles_df.at[existing_profile_index, 'profile_llm'] = profile_text
-        profiles_df.at[existing_profile_index, 'classification'] = classification_str
-    else:
-        # Add a new row
-        new_row = pd.DataFrame([{
-            'oaid': matched_author['oaid'],
-            'name': matched_author['name'],
-            'profile_llm': profile_text,
-            'classification': classification_str
-        }])
-        profiles_df = pd.concat([profiles_df, new_row], ignore_index=True)
-
-    # Save the updated CSV
-    profiles_df.to_csv(output_csv, index=False)
-
-    print(f"Profile for {latest_entry['name']} (OAID: {latest_entry['oaid']}) has been saved to {output_csv}")
-
-def regenerate_profile(existing_profile, user_input):
+    # Generate the profile and challenges from the author's papers
+    try:
+        profile_text, classification = profile_from_papers(
+            corpus.ranked_papers(oaid), author_name,
+            use_cache=use_cache, stream_handler=stream_handler, ranked=True
+        )
+    finally:
+        corpus.close()
+
+    # Save the profile to the author's row; the store also updates the full-text index
+    profileStore.upsert_profile(oaid, {
+        'name': author_name,
+        'profile_llm': profile_text,
+        'classification': json.dumps(classification),
+    }, output_csv)
+
+    print(f"Profile for {author_name} (OAID: {oaid}) has been saved.")
+    return profile_text, classification
+
+def generate_profile_for_latest_entry(json_file, output_csv, use_cache=True, stream_handler=None):
     """
-    Regenerate a profile based on the existing profile and user input.
-    
-    Args:
-        existing_profile (str): The original profile text.
-        user_input (str): Additional input from the user.
+    Generate a profile for the latest entry in the profile store.
+
+    Kept for existing callers; generate_profile_for_oaid works for any author.
 
     Returns:
-        str: The updated profile generated by the LLM.
+        tuple: The profile text and the list of climate challenges, or None if no profile was generated.
     """
-    prompt = f"""
+    latest_entry = profileStore.latest_profile(output_csv)
+    if latest_entry is None or not latest_entry['oaid']:
+        print("The profile store has no latest entry with an OpenAlex ID to process.")
+        return
+    return generate_profile_for_oaid(
+        latest_entry['oaid'], json_file, output_csv, use_cache=use_cache, stream_handler=stream_handler
+    )
+
+def build_regenerate_prompt(existing_profile, user_input):
+    """
+    Build the user prompt asking to update a profile with the user's input.
+    """
+    return f"""
     Here is the original profile:
     {existing_profile}
 
@@ -160,14 +252,18 @@ def regenerate_profile(existing_profile, user_input):
     Re-write the Relevant climate challenges in the format: X, Y, Z
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": pre_prompt},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=500,
-        temperature=0.5
-    )
-    content = response.choices[0].message.content.strip()
-    return content
+def regenerate_profile(existing_profile, user_input, use_cache=True, stream_handler=None):
+    """
+    Regenerate a profile based on the existing profile and user input.
+    
+    Args:
+        existing_profile (str): The original profile text.
+        user_input (str): Additional input from the user.
+        use_cache (bool): Set to False to bypass the LLM cache.
+        stream_handler (callable): Optional consumer of the streamed completion, see chat_completion.
+
+    Returns:
+        str: The updated profile generated by the LLM.
+    """
+    prompt = build_regenerate_prompt(existing_profile, user_input)
+    return chat_completion(prompt, use_cache=use_cache, stream_handler=stream_handler)
@@ -0,0 +1,107 @@
+import argparse
+import metrics
+import paperStore
+import profileStore
+from fetchPapers import fetch_author_papers, harvest_institution
+from nameSearch import institution_id
+
+# File paths
+input_csv = 'authors_profiles.csv'
+json_file = 'authors_papers.json'
+
+def tracked_authors(csv_file, conn):
+    """
+    Collect the authors we track from the profile store and the paper store.
+
+    Returns:
+        dict: OAID to author name.
+    """
+    authors = {}
+    for author in paperStore.iter_authors(conn):
+        authors[author['oaid']] = author['name']
+
+    df = profileStore.read_profiles(csv_file, columns=['oaid', 'name'])
+    for oaid, name in zip(df['oaid'], df['name']):
+        if isinstance(oaid, str) and oaid.strip():
+            # Profile rows may predate canonical OAIDs; match them to the paper store's keys
+            authors.setdefault(paperStore.normalize_oaid(oaid), name)
+
+    return authors
+
+def harvest_refresh(csv_file=input_csv, json_file=json_file, institution=institution_id):
+    """
+    Refresh every tracked author's papers from a single institution-wide sweep.
+
+    Returns:
+        int: The number of authors updated in the paper store.
+    """
+    conn = paperStore.open_for_json(json_file)
+    try:
+        authors = tracked_authors(csv_file, conn)
+        print(f"Harvesting works for {len(authors)} tracked authors at {institution}")
+
+        papers_by_author, works_scanned = harvest_institution(authors, institution, json_file)
+        updated = 0
+        for oaid, papers in papers_by_author.items():
+            if papers:
+                paperStore.merge_papers(conn, oaid, papers, name=authors[oaid])
+                updated += 1
+        metrics.update_metrics(conn)
+    finally:
+        conn.close()
+
+    print(f"Scanned {works_scanned} works and updated {updated} authors.")
+    return updated
+
+def incremental_refresh(csv_file=input_csv, json_file=json_file):
+    """
+    Refresh each tracked author with only the works created or updated since their last sync.
+
+    Stored papers are merged in place, so citation counts stay current.
+    Authors that were never synced get a full fetch.
+
+    Returns:
+        dict: Lists of refreshed OAIDs and (oaid, error) failures.
+    """
+    conn = paperStore.open_for_json(json_file)
+    refreshed, failed = [], []
+    try:
+        authors = tracked_authors(csv_file, conn)
+        for i, (oaid, name) in enumerate(authors.items(), start=1):
+            stored = paperStore.get_author(conn, oaid)
+            since = stored['last_synced'] if stored else None
+            synced_at = paperStore.utc_now()
+            try:
+                papers, _ = fetch_author_papers(oaid, since=since, json_file=json_file)
+            except Exception as e:
+                failed.append((oaid, str(e)))
+                continue
+
+            added, updated = paperStore.merge_papers(conn, oaid, papers, name=name, synced_at=synced_at)
+            refreshed.append(oaid)
+            print(f"[{i}/{len(authors)}] {name}: {added} new, {updated} updated (since {since or 'never'})")
+        metrics.update_metrics(conn)
+    finally:
+        conn.close()
+
+    print(f"Refreshed {len(refreshed)} authors, {len(failed)} failed.")
+    for oaid, error in failed:
+        print(f"  {oaid}: {error}")
+    return {'refreshed': refreshed, 'failed': failed}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Refresh stored papers for tracked authors.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--harvest', action='store_true',
+                      help="Sweep all works of the institution in one pass.")
+    mode.add_argument('--incremental', action='store_true',
+                      help="Fetch only works created or updated since each author's last sync.")
+    parser.add_argument('--institution', default=institution_id)
+    parser.add_argument('--csv', default=input_csv)
+    parser.add_argument('--json', default=json_file)
+    args = parser.parse_args()
+
+    if args.harvest:
+        harvest_refresh(args.csv, args.json, args.institution)
+    else:
+        incremental_refresh(args.csv, args.json)
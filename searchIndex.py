@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+
+# File paths
+index_file = 'search_index.db'
+csv_file = 'authors_profiles.csv'
+json_file = 'authors_papers.json'
+
+# BM25 column weights: a match in a title counts double one in an abstract
+title_weight = 2.0
+abstract_weight = 1.0
+name_weight = 3.0
+profile_weight = 1.0
+
+def index_path_for(store_file):
+    """
+    Return the index that sits next to a paper or profile store.
+    """
+    return os.path.join(os.path.dirname(store_file), index_file)
+
+def connect(db_file=index_file):
+    """
+    Open the full-text index, creating its tables if needed.
+
+    Papers and profiles each have an FTS5 table whose rowid comes from a plain
+    keyed table (works by OpenAlex work ID, profiles by OAID), so a document can
+    be found and replaced by key without scanning the index.
+    """
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS works (id INTEGER PRIMARY KEY, work_id TEXT NOT NULL UNIQUE);
+        CREATE TABLE IF NOT EXISTS work_authors (
+            work_id TEXT NOT NULL,
+            oaid TEXT NOT NULL,
+            PRIMARY KEY (work_id, oaid)
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5(
+            title, abstract, tokenize = 'porter unicode61'
+        );
+        CREATE TABLE IF NOT EXISTS profiles (id INTEGER PRIMARY KEY, oaid TEXT NOT NULL UNIQUE);
+        CREATE VIRTUAL TABLE IF NOT EXISTS profiles_fts USING fts5(
+            name, profile_llm, profile_llm_human, tokenize = 'porter unicode61'
+        );
+        """
+    )
+    return conn
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query matching all of its words.
+
+    Words are quoted so that punctuation and FTS5 operators in user input
+    cannot cause syntax errors.
+    """
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{word}"' for word in words)
+
+def index_papers(oaid, papers, db_file=index_file):
+    """
+    Add an author's papers to the index.
+
+    Works already indexed (e.g. through a co-author) are linked to the author,
+    and re-indexed only when their title or abstract changed.
+
+    Returns:
+        int: The number of works newly indexed or re-indexed.
+    """
+    papers = [paper for paper in papers if paper.get('id')]
+    if not papers:
+        return 0
+
+    conn = connect(db_file)
+    try:
+        with conn:
+            # Indexed text per known work ID
+            known = {}
+            ids = [paper['id'] for paper in papers]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row in conn.execute(
+                    f"""
+                    SELECT works.work_id, works.id, works_fts.title, works_fts.abstract
+                    FROM works JOIN works_fts ON works_fts.rowid = works.id
+                    WHERE works.work_id IN ({placeholders})
+                    """,
+                    chunk
+                ):
+                    known[row['work_id']] = (row['id'], row['title'], row['abstract'])
+
+            added = 0
+            for paper in papers:
+                text = (paper.get('title') or "", paper.get('abstract') or "")
+                if paper['id'] in known:
+                    rowid, *indexed = known[paper['id']]
+                    if tuple(indexed) == text:
+                        continue
+                    conn.execute("DELETE FROM works_fts WHERE rowid = ?", (rowid,))
+                else:
+                    rowid = conn.execute("INSERT INTO works (work_id) VALUES (?)", (paper['id'],)).lastrowid
+                known[paper['id']] = (rowid, *text)
+                conn.execute(
+                    "INSERT INTO works_fts (rowid, title, abstract) VALUES (?, ?, ?)",
+                    (rowid, *text)
+                )
+                added += 1
+
+            conn.executemany(
+                "INSERT OR IGNORE INTO work_authors (work_id, oaid) VALUES (?, ?)",
+                [(paper['id'], oaid) for paper in papers]
+            )
+        return added
+    finally:
+        conn.close()
+
+def unlink_papers(oaid, work_ids, db_file=index_file):
+    """
+    Unlink works from an author, dropping those no author is linked to any more.
+
+    Returns:
+        int: The number of works dropped from the index.
+    """
+    if not work_ids:
+        return 0
+    conn = connect(db_file)
+    try:
+        with conn:
+            ids = json.dumps(list(work_ids))
+            conn.execute(
+                "DELETE FROM work_authors WHERE oaid = ? AND work_id IN (SELECT value FROM json_each(?))",
+                (oaid, ids)
+            )
+            dropped = conn.execute(
+                """
+                DELETE FROM works
+                WHERE work_id IN (SELECT value FROM json_each(?))
+                  AND work_id NOT IN (SELECT work_id FROM work_authors)
+                RETURNING id
+                """,
+                (ids,)
+            ).fetchall()
+            conn.executemany("DELETE FROM works_fts WHERE rowid = ?", [(row['id'],) for row in dropped])
+        return len(dropped)
+    finally:
+        conn.close()
+
+def index_profiles(rows, db_file=index_file):
+    """
+    Add or replace author profiles in the index in one transaction.
+
+    Args:
+        rows (list): Dicts with 'oaid', 'name', 'profile_llm' and 'profile_llm_human'.
+
+    Returns:
+        int: The number of profiles indexed.
+    """
+    def text(value):
+        return value if isinstance(value, str) else ""
+
+    rows = [row for row in rows if isinstance(row.get('oaid'), str) and row['oaid']]
+    if not rows:
+        return 0
+
+    conn = connect(db_file)
+    try:
+        with conn:
+            for row in rows:
+                existing = conn.execute("SELECT id FROM profiles WHERE oaid = ?", (row['oaid'],)).fetchone()
+                if existing is None:
+                    rowid = conn.execute("INSERT INTO profiles (oaid) VALUES (?)", (row['oaid'],)).lastrowid
+                else:
+                    rowid = existing['id']
+                    conn.execute("DELETE FROM profiles_fts WHERE rowid = ?", (rowid,))
+                conn.execute(
+                    "INSERT INTO profiles_fts (rowid, name, profile_llm, profile_llm_human) VALUES (?, ?, ?, ?)",
+                    (rowid, text(row.get('name')), text(row.get('profile_llm')), text(row.get('profile_llm_human')))
+                )
+        return len(rows)
+    finally:
+        conn.close()
+
+def index_profile(oaid, name, profile_llm=None, profile_llm_human=None, db_file=index_file):
+    """
+    Add or replace one author's profile in the index.
+    """
+    index_profiles([{
+        'oaid': oaid, 'name': name, 'profile_llm': profile_llm, 'profile_llm_human': profile_llm_human,
+    }], db_file)
+
+def search_papers(query, limit=20, db_file=index_file):
+    """
+    Return the papers best matching a query, ranked by BM25.
+
+    Returns:
+        list: Dicts with 'work_id', 'title', 'snippet', 'oaids' and 'score' (higher is better).
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    conn = connect(db_file)
+    try:
+        rows = conn.execute(
+            """
+            SELECT works.work_id, works_fts.title,
+                   snippet(works_fts, 1, '**', '**', '...', 24) AS snippet,
+                   -bm25(works_fts, ?, ?) AS score,
+                   (SELECT group_concat(oaid, ' ') FROM work_authors
+                    WHERE work_authors.work_id = works.work_id) AS oaids
+            FROM works_fts JOIN works ON works.id = works_fts.rowid
+            WHERE works_fts MATCH ?
+            ORDER BY bm25(works_fts, ?, ?)
+            LIMIT ?
+            """,
+            (title_weight, abstract_weight, match, title_weight, abstract_weight, limit)
+        ).fetchall()
+        return [dict(row, oaids=(row['oaids'] or "").split()) for row in rows]
+    finally:
+        conn.close()
+
+def search_profiles(query, limit=20, db_file=index_file):
+    """
+    Return the author profiles best matching a query, ranked by BM25.
+
+    Returns:
+        list: Dicts with 'oaid', 'name', 'snippet' and 'score' (higher is better).
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    conn = connect(db_file)
+    try:
+        rows = conn.execute(
+            """
+            SELECT profiles.oaid, profiles_fts.name,
+                   snippet(profiles_fts, -1, '**', '**', '...', 24) AS snippet,
+                   -bm25(profiles_fts, ?, ?, ?) AS score
+            FROM profiles_fts JOIN profiles ON profiles.id = profiles_fts.rowid
+            WHERE profiles_fts MATCH ?
+            ORDER BY bm25(profiles_fts, ?, ?, ?)
+            LIMIT ?
+            """,
+            (name_weight, profile_weight, profile_weight, match,
+             name_weight, profile_weight, profile_weight, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+def sync_index(json_file=json_file, csv_file=csv_file, db_file=None):
+    """
+    Bring the index up to date with the paper store and the profile store.
+
+    Works not yet indexed or whose text changed are indexed; profiles are re-indexed.
+    The index defaults to the one next to the paper store.
+
+    Returns:
+        tuple: (works added, profiles indexed).
+    """
+    # Imported here to avoid circular imports: both stores index their writes
+    import paperStore
+    import profileStore
+
+    db_file = db_file or index_path_for(paperStore.store_path_for(json_file))
+    works_added = 0
+    conn = paperStore.open_for_json(json_file)
+    try:
+        for author in paperStore.iter_authors(conn):
+            works_added += index_papers(author['oaid'], author['papers'], db_file)
+    finally:
+        conn.close()
+
+    profiles_df = profileStore.read_profiles(csv_file, columns=['oaid', 'name', 'profile_llm', 'profile_llm_human'])
+    profiles_indexed = index_profiles(profiles_df.to_dict('records'), db_file)
+
+    print(f"Indexed {works_added} new works and {profiles_indexed} profiles.")
+    return works_added, profiles_indexed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or query the full-text search index.")
+    parser.add_argument('--sync', action='store_true', help="Index new works and all profiles.")
+    parser.add_argument('--query', help="Search papers and profiles.")
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.sync:
+        sync_index()
+    if args.query:
+        for profile in search_profiles(args.query, args.limit):
+            print(f"[profile {profile['score']:.2f}] {profile['name']} ({profile['oaid']}): {profile['snippet']}")
+        for paper in search_papers(args.query, args.limit):
+            print(f"[paper {paper['score']:.2f}] {paper['title']} ({paper['work_id']})")
@@ -0,0 +1,119 @@
+import numpy as np
+
+import clustering
+
+try:
+    import hnswlib
+except ImportError:  # optional: without it every query uses the exact path
+    hnswlib = None
+
+# Index settings
+exact_threshold = 5000  # below this many authors, search the normalised matrix exactly
+hnsw_m = 16
+hnsw_ef_construction = 200
+hnsw_ef_search = 64
+
+class SimilarityIndex:
+    """
+    Cosine top-k search over the stored profile embeddings.
+
+    Small stores are searched exactly with one matrix-vector product over the
+    L2-normalised embeddings. Larger stores use an approximate HNSW graph
+    index (hnswlib), built in memory.
+    """
+
+    def __init__(self, store=None, exact_threshold=exact_threshold):
+        self.store = store or clustering.embedding_store
+        self.rows = self.store.rows
+        self.records = self.store.records()
+        self.size = len(self.records)
+        vectors = np.asarray(self.store.vectors(self.records), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.maximum(norms, 1e-12)
+
+        self.hnsw = None
+        if hnswlib is not None and self.size >= exact_threshold:
+            self.hnsw = self._build_hnsw()
+
+    def _build_hnsw(self):
+        index = hnswlib.Index(space="cosine", dim=self.vectors.shape[1])
+        index.init_index(max_elements=self.size, ef_construction=hnsw_ef_construction, M=hnsw_m)
+        index.add_items(self.vectors, np.arange(self.size))
+        index.set_ef(hnsw_ef_search)
+        return index
+
+    def query_vector(self, vector, k=5, exclude_oaid=None):
+        """
+        Return the k most similar authors to a vector.
+
+        Returns:
+            list: Dicts with 'oaid', 'name', 'classification' and cosine 'score', best first.
+        """
+        if self.size == 0:
+            return []
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / max(np.linalg.norm(vector), 1e-12)
+        # Fetch a few extra so excluded authors do not shorten the result
+        fetch = min(self.size, k + 5 if exclude_oaid else k)
+
+        if self.hnsw is not None:
+            labels, distances = self.hnsw.knn_query(vector, k=fetch)
+            candidates = zip(labels[0], 1 - distances[0])
+        else:
+            scores = self.vectors @ vector
+            top = np.argpartition(-scores, fetch - 1)[:fetch]
+            top = top[np.argsort(-scores[top])]
+            candidates = zip(top, scores[top])
+
+        results = []
+        for row, score in candidates:
+            record = self.records[int(row)]
+            if exclude_oaid and record.get("oaid") == exclude_oaid:
+                continue
+            results.append({
+                "oaid": record.get("oaid"),
+                "name": record.get("name"),
+                "classification": record.get("classification"),
+                "score": float(score),
+            })
+            if len(results) == k:
+                break
+        return results
+
+    def similar_to_author(self, oaid, k=5):
+        """
+        Return the k authors most similar to a stored author, excluding the author.
+        """
+        rows = [row for row, record in enumerate(self.records) if record.get("oaid") == oaid]
+        if not rows:
+            raise KeyError(f"No embedding stored for OAID {oaid}.")
+        return self.query_vector(self.vectors[rows[0]], k=k, exclude_oaid=oaid)
+
+    def similar_to_text(self, text, k=5):
+        """
+        Return the k authors most similar to free text, embedded with the same SPECTER2 model.
+        """
+        return self.query_vector(clustering.generate_embedding(text), k=k)
+
+_index = None
+
+def get_index():
+    """
+    Return the process-wide index, rebuilt when rows have been added to the embedding store.
+    """
+    global _index
+    if _index is None or _index.rows != clustering.embedding_store.rows:
+        _index = SimilarityIndex()
+    return _index
+
+def similar_researchers(oaid, k=5):
+    """
+    Return the k researchers whose profiles are closest to the given author's.
+    """
+    return get_index().similar_to_author(oaid, k=k)
+
+def search_researchers(text, k=5):
+    """
+    Return the k researchers whose profiles are closest to a free-text query.
+    """
+    return get_index().similar_to_text(text, k=k)
@@ -0,0 +1,48 @@
+import importlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("bokeh")
+
+# Short profile-like texts of different lengths, so batches are padded
+texts = [
+    "Develops low-cost sorbents for direct air capture of carbon dioxide.",
+    "Models heat waves and their impact on urban health using climate ensembles and mortality records.",
+    "Battery materials.",
+    "Designs offshore wind farm layouts that reduce wake losses, combining computational fluid dynamics "
+    "with field measurements and machine-learned surrogate models of turbine interactions.",
+    "Studies methane emissions from rice paddies and how irrigation practices change them.",
+]
+
+def specter2_cached():
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return False
+    return (
+        isinstance(try_to_load_from_cache("allenai/specter2_base", "config.json"), str)
+        and isinstance(try_to_load_from_cache("allenai/specter2_classification", "adapter_config.json"), str)
+    )
+
+@pytest.fixture
+def clustering(tmp_path, monkeypatch):
+    # The module opens the profile and embedding stores of the working directory on import
+    monkeypatch.chdir(tmp_path)
+    import clustering
+    return importlib.reload(clustering)
+
+@pytest.mark.skipif(not specter2_cached(), reason="SPECTER2 is not in the Hugging Face cache.")
+@pytest.mark.parametrize("backend", ["int8", "onnx"])
+def test_backend_parity_with_fp32(clustering, backend):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+
+    reference = np.asarray(clustering.generate_embeddings(texts, backend="fp32"))
+    embeddings = np.asarray(clustering.generate_embeddings(texts, backend=backend))
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    cosine = np.sum(reference * embeddings, axis=1)
+    assert cosine.min() >= clustering.parity_min_cosine